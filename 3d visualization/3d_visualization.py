@@ -5,12 +5,20 @@ import SimpleITK as sitk
 import vtk
 from vtk.util import numpy_support
 from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
-import scipy.ndimage as ndimage  # <--- Added for Hollowing
 
 from PyQt5.QtWidgets import (QApplication, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QWidget, QFileDialog, QFrame, QLabel, QSplitter, QMessageBox, QInputDialog)
+                             QWidget, QFileDialog, QFrame, QLabel, QSplitter, QMessageBox, QInputDialog,
+                             QComboBox, QSpinBox)
 from PyQt5.QtCore import Qt
 
+# Surface engines are shared with the GUI viewer (VTK only, no Qt dependency)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gui"))
+from surface_extraction import SURFACE_ENGINES, DEFAULT_ENGINE, extract_surface
+from hollow_shell import HollowShell, MAX_WALL_THICKNESS
+from dicom_loader import order_series, load_series
+from dicom_index import SeriesIndex
+from volume_rendering import VOLUME_PRESETS, DEFAULT_PRESET, build_volume, apply_preset
+
 class MRIViewer(QWidget):
     def __init__(self):
         super().__init__()
@@ -21,6 +29,10 @@ class MRIViewer(QWidget):
         self.sitk_image = None
         self.np_data = None
         self.spacing = None
+        self.hollow_shell = None  # cached distance field, see hollow_shell.py
+        self.mesh_generated = False
+        self.dicom_index = SeriesIndex()  # cached headers, only new/changed files are parsed
+        self.volume = None  # vtkVolume while in volume rendering mode
 
         # --- Main Layout ---
         self.main_layout = QHBoxLayout(self)
@@ -47,6 +59,28 @@ class MRIViewer(QWidget):
         self.btn_show_3d = QPushButton("Generate Hollow 3D")
         self.btn_show_3d.clicked.connect(self.generate_3d_mesh)
         
+        # 4. Surface engine
+        self.lbl_engine = QLabel("Surface Engine:")
+        self.combo_engine = QComboBox()
+        self.combo_engine.addItems(SURFACE_ENGINES)
+        self.combo_engine.setCurrentText(DEFAULT_ENGINE)
+        
+        # 4b. Volume rendering (no mesh extraction, CPU ray casting)
+        self.btn_volume = QPushButton("Volume Render")
+        self.btn_volume.clicked.connect(self.generate_volume_rendering)
+        self.lbl_preset = QLabel("Transfer Function:")
+        self.combo_preset = QComboBox()
+        self.combo_preset.addItems(VOLUME_PRESETS.keys())
+        self.combo_preset.setCurrentText(DEFAULT_PRESET)
+        self.combo_preset.currentTextChanged.connect(self.on_preset_changed)
+        
+        # 5. Wall thickness (re-thresholds the cached shell, no re-erosion)
+        self.lbl_thickness = QLabel("Wall Thickness (voxels):")
+        self.spin_thickness = QSpinBox()
+        self.spin_thickness.setRange(1, MAX_WALL_THICKNESS)
+        self.spin_thickness.setValue(2)
+        self.spin_thickness.valueChanged.connect(self.on_thickness_changed)
+        
         self.lbl_status = QLabel("Status: Ready")
         self.lbl_status.setWordWrap(True)
 
@@ -55,7 +89,15 @@ class MRIViewer(QWidget):
         self.control_layout.addWidget(self.btn_load_dicom)
         self.control_layout.addWidget(self.btn_clear)
         self.control_layout.addSpacing(20)
+        self.control_layout.addWidget(self.lbl_engine)
+        self.control_layout.addWidget(self.combo_engine)
+        self.control_layout.addWidget(self.lbl_thickness)
+        self.control_layout.addWidget(self.spin_thickness)
         self.control_layout.addWidget(self.btn_show_3d)
+        self.control_layout.addSpacing(20)
+        self.control_layout.addWidget(self.lbl_preset)
+        self.control_layout.addWidget(self.combo_preset)
+        self.control_layout.addWidget(self.btn_volume)
         self.control_layout.addWidget(self.lbl_status)
         self.control_layout.addStretch()
 
@@ -69,6 +111,9 @@ class MRIViewer(QWidget):
         self.vtkWidget.GetRenderWindow().AddRenderer(self.renderer)
         self.iren = self.vtkWidget.GetRenderWindow().GetInteractor()
         self.renderer.SetBackground(0.1, 0.1, 0.1) 
+        # Frame rate the volume ray caster aims for while the camera moves
+        self.iren.SetDesiredUpdateRate(15.0)
+        self.iren.SetStillUpdateRate(0.001)
 
         self.splitter.addWidget(self.control_panel)
         self.splitter.addWidget(self.vtk_frame)
@@ -81,6 +126,9 @@ class MRIViewer(QWidget):
         self.sitk_image = None
         self.np_data = None
         self.spacing = None
+        self.hollow_shell = None
+        self.mesh_generated = False
+        self.volume = None
         
         self.renderer.RemoveAllViewProps()
         self.vtkWidget.GetRenderWindow().Render()
@@ -106,55 +154,106 @@ class MRIViewer(QWidget):
         
         if folder_path:
             try:
-                reader = sitk.ImageSeriesReader()
-                dicom_names = reader.GetGDCMSeriesFileNames(folder_path)
+                self.lbl_status.setText("Reading DICOM headers...")
+                QApplication.processEvents()
+                headers = order_series(self.dicom_index.headers(folder_path))
                 
-                if not dicom_names:
+                if not headers:
                     self.lbl_status.setText("Error: No DICOM series found in folder.")
                     return
                 
-                reader.SetFileNames(dicom_names)
-                self.sitk_image = reader.Execute()
+                # Slices are decoded in parallel; the preview volume can be
+                # meshed or volume rendered while the rest loads
+                self.sitk_image = load_series(headers, progress=self.on_dicom_progress,
+                                              preview=self.on_dicom_preview)
                 self.process_image_data()
+                if self.mesh_generated:
+                    self.generate_3d_mesh()
+                elif self.volume is not None:
+                    self.generate_volume_rendering()
                 self.lbl_status.setText(f"Loaded DICOM Series from:\n{os.path.basename(folder_path)}")
                 
             except Exception as e:
                 self.lbl_status.setText(f"DICOM Error: {e}")
 
+    def on_dicom_progress(self, done, total):
+        if done == total or done % 8 == 0:
+            self.lbl_status.setText(f"Loading DICOM: {done}/{total} slices")
+            QApplication.processEvents()
+
+    def on_dicom_preview(self, preview_image):
+        self.sitk_image = preview_image
+        self.process_image_data()
+        self.lbl_status.setText("Coarse preview ready (every few slices), full series still loading...")
+        QApplication.processEvents()
+
     def process_image_data(self):
         self.np_data = sitk.GetArrayFromImage(self.sitk_image)
         self.spacing = self.sitk_image.GetSpacing()
+        self.hollow_shell = None
         print(f"Data Shape: {self.np_data.shape}, Spacing: {self.spacing}")
 
+    def on_thickness_changed(self, value):
+        # Only the threshold changes, so a shown model can follow the spin box live
+        if self.mesh_generated:
+            self.generate_3d_mesh()
+
+    def generate_volume_rendering(self):
+        """Show the raw volume with a transfer function instead of a surface mesh."""
+        if self.np_data is None:
+            self.lbl_status.setText("Error: Load a file first.")
+            return
+
+        self.lbl_status.setText("Preparing volume rendering...")
+        QApplication.processEvents()
+
+        try:
+            self.volume = build_volume(self.np_data, self.spacing, self.combo_preset.currentText())
+        except Exception as e:
+            self.lbl_status.setText(f"Volume Rendering Error: {e}")
+            return
+
+        self.mesh_generated = False
+        self.renderer.RemoveAllViewProps()
+        self.renderer.AddVolume(self.volume)
+        self.renderer.ResetCamera()
+        self.vtkWidget.GetRenderWindow().Render()
+        self.lbl_status.setText(f"Status: Volume Rendering ({self.combo_preset.currentText()})")
+
+    def on_preset_changed(self, preset_name):
+        # Swapping transfer functions needs no new volume
+        if self.volume is not None:
+            apply_preset(self.volume.GetProperty(), preset_name, self.np_data)
+            self.vtkWidget.GetRenderWindow().Render()
+            self.lbl_status.setText(f"Status: Volume Rendering ({preset_name})")
+
     def generate_3d_mesh(self):
         if self.np_data is None:
             self.lbl_status.setText("Error: Load a file first.")
             return
 
         self.lbl_status.setText("Processing Hollow 3D... Please wait.")
+        self.volume = None
         QApplication.processEvents() 
 
         # --- 1. HOLLOWING LOGIC START ---
         
-        # Define Thickness (2 voxels is a safe default for visibility)
-        wall_thickness = 2
+        # Thickness from the spin box (2 voxels is a safe default for visibility)
+        wall_thickness = self.spin_thickness.value()
         
-        # Create a Binary Mask 
+        # The distance field is computed once per volume (cropped to the
+        # foreground box, slab-parallel); each thickness is just a threshold.
         # (Assuming your file is a segmentation where > 0 is the object)
         # If using raw MRI, you might want to raise this (e.g., > 200 for bone)
-        mask = self.np_data > 0  
-        
-        # Create Structure for erosion (3D connectivity)
-        struct = ndimage.generate_binary_structure(3, 1)
+        if self.hollow_shell is None:
+            self.hollow_shell = HollowShell(self.np_data > 0)
+            print(f"Shell distance field: {self.hollow_shell.elapsed_ms:.1f} ms")
         
-        # Erode (shrink) the mask
-        eroded_mask = ndimage.binary_erosion(mask, structure=struct, iterations=wall_thickness)
-        
-        # Subtract eroded from original (XOR) to get the shell
-        hollow_mask = mask ^ eroded_mask
-        
-        # Prepare data for VTK (Convert boolean mask back to uint8)
-        data_matrix = hollow_mask.astype(np.uint8) 
+        # Shell = mask XOR erode(mask, wall_thickness), already uint8
+        data_matrix = self.hollow_shell.shell(wall_thickness)
+        if data_matrix is None:
+            self.lbl_status.setText("Error: No foreground voxels (> 0) in this volume.")
+            return
         
         # --- HOLLOWING LOGIC END ---
 
@@ -168,26 +267,17 @@ class MRIViewer(QWidget):
         img_vtk = vtk.vtkImageData()
         img_vtk.SetDimensions(data_matrix.shape[2], data_matrix.shape[1], data_matrix.shape[0])
         img_vtk.SetSpacing(self.spacing[0], self.spacing[1], self.spacing[2])
+        # The shell is cropped, so shift it back to where the box sits in the volume
+        z0, y0, x0 = self.hollow_shell.start
+        img_vtk.SetOrigin(x0 * self.spacing[0], y0 * self.spacing[1], z0 * self.spacing[2])
         img_vtk.GetPointData().SetScalars(vtk_data_array)
 
-        # 3. Marching Cubes
-        dmc = vtk.vtkDiscreteMarchingCubes()
-        dmc.SetInputData(img_vtk)
-        dmc.GenerateValues(1, 1, 1) 
-
-        # 4. Smoothing
-        smoother = vtk.vtkWindowedSincPolyDataFilter()
-        smoother.SetInputConnection(dmc.GetOutputPort())
-        smoother.SetNumberOfIterations(15) 
-        smoother.SetPassBand(0.005) 
-        smoother.BoundarySmoothingOff()
-        smoother.FeatureEdgeSmoothingOff()
-        smoother.NonManifoldSmoothingOn()
-        smoother.NormalizeCoordinatesOn()
+        # 3. Surface extraction + 4. Smoothing (engine selected in the control panel)
+        surface = extract_surface(img_vtk, [1], self.combo_engine.currentText(), pass_band=0.005)
 
         # 5. Rendering
         mapper = vtk.vtkPolyDataMapper()
-        mapper.SetInputConnection(smoother.GetOutputPort())
+        mapper.SetInputData(surface)
         mapper.ScalarVisibilityOff()
 
         actor = vtk.vtkActor()
@@ -226,7 +316,8 @@ class MRIViewer(QWidget):
         self.renderer.ResetCamera()
         self.vtkWidget.GetRenderWindow().Render()
         
-        self.lbl_status.setText("Status: Hollow 3D Generated")
+        self.mesh_generated = True
+        self.lbl_status.setText(f"Status: Hollow 3D Generated (wall {wall_thickness} voxels)")
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -1,15 +1,46 @@
 import os
+import sys
 import nibabel as nib
 import numpy as np
 import pandas as pd
 from monai.metrics import compute_dice, compute_hausdorff_distance, compute_iou
 import torch
 
-def load_nifti(path):
+# Memory-mapped volume store shared with the GUI (gui/volume_store.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gui"))
+from volume_store import VolumeStore
+from mask_format import MASK_SUFFIX, load_mask
+from metrics_store import METRICS_DB, write_metrics
+
+def load_nifti(path, store=None):
+    if path.endswith(MASK_SUFFIX):
+        # Compact mask (gui/mask_format.py), expanded to the full i,j,k grid
+        mask = load_mask(path)
+        return mask.full().T, mask.affine()
+    if store is not None:
+        # Uncompressed memory-mapped copy: same i,j,k voxel order and affine
+        # as nibabel, without gunzipping the file again
+        volume = store.open(path)
+        return volume.ijk_array(), volume.affine
     img = nib.load(path)
     data = img.get_fdata()
     return data, img.affine
 
+def load_mask_pair(gt_path, pred_path):
+    """Decode two compact masks over the union of their bounding boxes only.
+
+    Dice, IoU and HD95 only depend on the foreground, so a shared box that
+    holds every foreground voxel (plus a background margin) gives the same
+    metrics as the full grids at a fraction of the memory.
+    """
+    gt, pred = load_mask(gt_path), load_mask(pred_path)
+    boxes = [m for m in (gt, pred) if not m.is_empty()]
+    if gt.shape != pred.shape or not boxes:
+        return gt.full().T, pred.full().T
+    start = [max(min(m.start[i] for m in boxes) - 1, 0) for i in range(3)]
+    stop = [min(max(m.stop[i] for m in boxes) + 1, gt.shape[i]) for i in range(3)]
+    return gt.region(start, stop).T, pred.region(start, stop).T
+
 def calculate_metrics(y_pred, y):
     # Ensure they are binary masks (0 or 1)
     y_pred = (y_pred > 0.5).astype(np.float32)
@@ -38,7 +69,7 @@ def calculate_metrics(y_pred, y):
         
     return dice, iou, hd
 
-def evaluate_model(model_name, model_dir, gt_dir, prefix=""):
+def evaluate_model(model_name, model_dir, gt_dir, prefix="", store=None):
     results = []
     organs = ["Kidneys", "Liver", "Stomach"]
     
@@ -50,20 +81,36 @@ def evaluate_model(model_name, model_dir, gt_dir, prefix=""):
             print(f"Skipping {organ} for {model_name} as directory is missing")
             continue
             
-        gt_files = [f for f in os.listdir(gt_organ_dir) if f.endswith('.nii.gz')]
+        # One ground truth per structure, the compact mask when both formats exist
+        gt_files = {}
+        for f in sorted(os.listdir(gt_organ_dir)):
+            for suffix in (MASK_SUFFIX, '.nii.gz'):
+                if f.endswith(suffix):
+                    stem = f[:-len(suffix)]
+                    if suffix == MASK_SUFFIX or stem not in gt_files:
+                        gt_files[stem] = f
+                    break
         
-        for gt_file in gt_files:
-            model_file = f"{prefix}{gt_file}"
+        for stem, gt_file in sorted(gt_files.items()):
             gt_path = os.path.join(gt_organ_dir, gt_file)
-            model_path = os.path.join(model_organ_dir, model_file)
+            # The prediction may be in either format, independent of the ground truth
+            model_path = None
+            for suffix in (MASK_SUFFIX, '.nii.gz'):
+                candidate = os.path.join(model_organ_dir, f"{prefix}{stem}{suffix}")
+                if os.path.exists(candidate):
+                    model_path = candidate
+                    break
             
-            if not os.path.exists(model_path):
-                print(f"Warning: Model file {model_file} not found for {model_name} in {organ}")
+            if model_path is None:
+                print(f"Warning: Model file {prefix}{stem} not found for {model_name} in {organ}")
                 continue
             
-            print(f"Evaluating {model_name} - {organ} - {gt_file}...")
-            y_gt, _ = load_nifti(gt_path)
-            y_pred, _ = load_nifti(model_path)
+            print(f"Evaluating {model_name} - {organ} - {stem}...")
+            if gt_path.endswith(MASK_SUFFIX) and model_path.endswith(MASK_SUFFIX):
+                y_gt, y_pred = load_mask_pair(gt_path, model_path)
+            else:
+                y_gt, _ = load_nifti(gt_path, store)
+                y_pred, _ = load_nifti(model_path, store)
             
             if y_gt.shape != y_pred.shape:
                 print(f"Shape mismatch for {gt_file}: GT {y_gt.shape}, Pred {y_pred.shape}. Skipping.")
@@ -72,7 +119,7 @@ def evaluate_model(model_name, model_dir, gt_dir, prefix=""):
             dice, iou, hd = calculate_metrics(y_pred, y_gt)
             results.append({
                 "Organ": organ,
-                "File": gt_file,
+                "File": f"{stem}.nii.gz",
                 "Dice": dice,
                 "IoU": iou,
                 "Hausdorff95": hd
@@ -88,12 +135,21 @@ def evaluate_model(model_name, model_dir, gt_dir, prefix=""):
     summary_file = f"{model_name}_summary.csv"
     summary.to_csv(summary_file, index=False)
     print(f"Saved summary for {model_name} to {summary_file}")
+
+    # Indexed copy of both tables for the GUI (read without pandas)
+    write_metrics(METRICS_DB, model_name, results)
+    print(f"Saved {model_name} metrics to {METRICS_DB}")
     
     return output_file
 
 if __name__ == "__main__":
     GT_DIR = r"C:\Users\Youssef\Desktop\Lulu\Assets\Ground-Truths"
     
+    # True: decode the ground truths (shared by every model) once into the
+    # memory-mapped store in ~/.cache instead of once per model
+    USE_VOLUME_STORE = False
+    store = VolumeStore() if USE_VOLUME_STORE else None
+    
     models = [
         {"name": "TotalSegmentator", "dir": r"C:\Users\Youssef\Desktop\Lulu\Assets\Total-Segmentator", "prefix": "ct_"},
         {"name": "SwinUnter", "dir": r"C:\Users\Youssef\Desktop\Lulu\Assets\SwinUnter", "prefix": ""},
@@ -101,4 +157,4 @@ if __name__ == "__main__":
     ]
     
     for model in models:
-        evaluate_model(model["name"], model["dir"], GT_DIR, model["prefix"])
+        evaluate_model(model["name"], model["dir"], GT_DIR, model["prefix"], store)
@@ -0,0 +1,426 @@
+"""
+Run every segmentation model on one CT and write the Assets/ model folders.
+
+The CT is decoded once (through the memory-mapped VolumeStore with --store) and
+oriented to RAS once; resampled tensors are cached per voxel spacing, so
+models that use the same spacing share one resample instead of each
+reloading and resampling the file:
+
+    Swin UNETR        BTCV bundle, 1.5 x 1.5 x 2.0 mm
+    WholeBody CT      MONAI wholeBody_ct_segmentation bundle, 1.5 mm (3.0 mm low-res)
+    Total Segmentator gets the decoded image in memory (it resamples internally)
+
+Each model's preprocessed input is kept in the PreprocessCache (keyed by the
+CT's contents and the model's preprocessing recipe), so re-running a study
+skips the decode-to-tensor resamples altogether. With crop=True only the
+body box of the CT is resampled (segment_ct.body_crop); label maps are
+pasted back onto the full grid.
+
+With a latency budget (--budget=SECONDS), Swin UNETR and WholeBody CT pick
+their sliding-window overlap, batch size and (WholeBody CT) resolution
+from the calibration profile written by --calibrate (most accurate when run
+with the per-model thread count, threads // concurrent models); chosen
+settings and achieved times are appended to inference_latency.jsonl.
+
+Models run concurrently on a thread pool; the CPU thread budget is split
+between them (PyTorch releases the GIL inside its kernels). Wall times per
+model (load and inference) are printed and saved to model_times.json.
+
+Each model's output goes to <assets_dir>/<model folder>/:
+    segmentation_output.nii.gz          BTCV label map (what the GUI loads)
+    segmentation_output_volumetrics.csv voxels, mL, bounding box, centroid per organ
+    <Organ>/<prefix><organ>.nii.gz      per-organ masks
+
+Usage:
+    python "Segmentation codes/run_models.py" ct.nii.gz Assets [threads] [concurrent models] [--crop] [--store]
+                                              [--budget=SECONDS]
+    python "Segmentation codes/run_models.py" --calibrate [threads]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import nibabel as nib
+import numpy as np
+import torch
+from monai.data import MetaTensor
+from monai.transforms import (
+    EnsureChannelFirst,
+    NormalizeIntensity,
+    Orientation,
+    ResampleToMatch,
+    ScaleIntensity,
+    ScaleIntensityRange,
+    Spacing,
+)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "swinUnter"))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "gui"))
+from segment_ct import (
+    BODY_CROP,
+    ORGAN_LABELS,
+    PREPROCESS_RECIPE,
+    body_crop,
+    build_network as build_swin_network,
+    cache_input,
+    cached_input,
+    crop_slices,
+    load_model as load_swin_model,
+    run_inference,
+)
+from inference_budget import (
+    calibrate,
+    choose_settings,
+    load_profile,
+    log_latency,
+    resampled_shape,
+    save_profile,
+)
+from volume_store import VolumeStore
+from preprocess_cache import PreprocessCache
+from label_export import BTCV_ORGAN_FILES, export_organ_masks, organ_paths
+from label_spaces import btcv_lut, remap_labels, totalsegmentator_names, wholebody_ct_names
+from volumetrics import organ_volumetrics, write_report
+
+SWIN_MODEL_PATH = os.path.join(SCRIPT_DIR, "swinUnter", "swin_unetr_btcv_segmentation", "models", "model.pt")
+WBCT_BUNDLE_DIR = os.path.join(SCRIPT_DIR, "WholeBodyCt", "monai_bundles", "wholeBody_ct_segmentation")
+
+# Written into every model folder (MedicalWorkspace.LABEL_MAP_FILE)
+LABEL_MAP_FILE = "segmentation_output.nii.gz"
+VOLUMETRICS_FILE = "segmentation_output_volumetrics.csv"
+
+# Budgeted settings and achieved times, one JSON line per model run
+LATENCY_LOG = "inference_latency.jsonl"
+
+
+class SharedInput:
+    """One decoded CT, with resampled copies cached per voxel spacing."""
+
+    def __init__(self, image_path, store=None, cache=None, crop=False):
+        start_time = time.perf_counter()
+        self.image_path = image_path
+        self.cache = cache
+        if store is not None:
+            volume = store.open(image_path)
+            self.affine = volume.affine
+            self.array = np.asarray(volume.ijk_array(), dtype=np.float32)
+        else:
+            image = nib.load(image_path)
+            self.affine = image.affine
+            self.array = image.get_fdata(dtype=np.float32)
+        self.original = MetaTensor(torch.from_numpy(self.array), affine=torch.as_tensor(self.affine),
+                                   meta={"filename_or_obj": image_path})
+        self.original = EnsureChannelFirst(channel_dim="no_channel")(self.original)
+        # The grid the models' inputs are resampled from (the body box with crop=True)
+        self.crop = body_crop(self.array, self.affine) if crop else None
+        self.source = self.original
+        if self.crop is not None:
+            self.source = MetaTensor(self.original.as_tensor()[(slice(None),) + crop_slices(self.crop)],
+                                     affine=torch.as_tensor(self.crop["affine"]),
+                                     meta={"filename_or_obj": image_path})
+            print(f"Body crop {[b - a for a, b in self.crop['box']]} of {self.crop['shape']} voxels")
+        self.oriented = Orientation(axcodes="RAS")(self.source)
+        self._resampled = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.resample_count = 0
+        print(f"Decoded {os.path.basename(image_path)} {self.array.shape} in "
+              f"{time.perf_counter() - start_time:.2f} s")
+
+    def resampled_shape(self, pixdim):
+        """Estimated shape of resampled(pixdim), without resampling."""
+        return resampled_shape(self.oriented.shape[1:], self.oriented.affine.numpy(), pixdim)
+
+    def resampled(self, pixdim):
+        """The RAS volume at `pixdim` (bilinear), computed once per spacing."""
+        key = tuple(float(v) for v in pixdim)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # Concurrent callers with the same spacing wait for the first one
+        with lock:
+            if key not in self._resampled:
+                start_time = time.perf_counter()
+                self._resampled[key] = Spacing(pixdim=key, mode="bilinear")(self.oriented)
+                self.resample_count += 1
+                print(f"Resampled to {key} mm in {time.perf_counter() - start_time:.2f} s")
+            return self._resampled[key]
+
+    def preprocessed(self, recipe, build):
+        """Model input for `recipe`: from the PreprocessCache, or build() (then cached)."""
+        if self.crop is not None:
+            recipe = dict(recipe, crop=BODY_CROP)
+        if self.cache is not None:
+            image = cached_input(self.cache, self.image_path, recipe)
+            if image is not None:
+                return image
+        image = build()
+        if self.cache is not None:
+            cache_input(self.cache, self.image_path, recipe, image)
+        return image
+
+    def to_original(self, seg, reference):
+        """Nearest-neighbour resample of a label volume on `reference`'s grid back to the CT grid."""
+        seg = MetaTensor(torch.as_tensor(seg[None]), affine=reference.affine)
+        seg = ResampleToMatch(mode="nearest")(seg, img_dst=self.source)[0].numpy().astype(np.uint8)
+        if self.crop is None:
+            return seg
+        # Outside the body box is background
+        restored = np.zeros(self.array.shape, dtype=np.uint8)
+        restored[crop_slices(self.crop)] = seg
+        return restored
+
+    def nifti(self):
+        """The CT as an in-memory nibabel image (no file is read)."""
+        return nib.Nifti1Image(self.array, self.affine)
+
+
+class SwinUNETRModel:
+    name = "Swin UNETR"
+    folder = "SwinUnter"
+    prefix = ""
+    threads = None  # CPU threads (None: torch's current count), set by run_models()
+    pixdim = tuple(PREPROCESS_RECIPE["pixdim"])
+
+    def __init__(self, model_path=SWIN_MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+        self.settings = None  # sliding-window settings from plan()
+
+    def network(self):
+        return build_swin_network()
+
+    def plan(self, shared, budget_s, profile, device):
+        self.settings = choose_settings(budget_s, self.name, {"highres": shared.resampled_shape(self.pixdim)},
+                                        profile, device, threads=self.threads)
+
+    def load(self, device):
+        self.device = device
+        self.model = load_swin_model(self.model_path, device)
+
+    def preprocess(self, shared):
+        # Same chain as segment_ct.preprocess_ct, so both share cache entries
+        a_min, a_max, b_min, b_max = PREPROCESS_RECIPE["intensity_range"]
+        image = shared.resampled(self.pixdim)
+        return ScaleIntensityRange(a_min=a_min, a_max=a_max, b_min=b_min, b_max=b_max, clip=True)(image)
+
+    def segment(self, shared):
+        image = shared.preprocessed(PREPROCESS_RECIPE, lambda: self.preprocess(shared))
+        seg = run_inference(self.model, image, self.device, settings=self.settings).astype(np.uint8)
+        # Swin UNETR predicts BTCV ids directly
+        return shared.to_original(seg, image)
+
+
+class WholeBodyCTModel:
+    name = "WholeBody CT"
+    folder = "WholeBodyCt"
+    prefix = ""
+    threads = None  # CPU threads (None: torch's current count), set by run_models()
+
+    HIGHRES_PIXDIM = (1.5, 1.5, 1.5)
+    LOWRES_PIXDIM = (3.0, 3.0, 3.0)
+
+    def __init__(self, bundle_dir=WBCT_BUNDLE_DIR, highres=True):
+        self.bundle_dir = bundle_dir
+        self.highres = highres
+        self.pixdim = self.HIGHRES_PIXDIM if highres else self.LOWRES_PIXDIM
+        self.settings = None  # sliding-window settings from plan()
+
+    def _parser(self):
+        from monai.bundle import ConfigParser
+
+        parser = ConfigParser()
+        parser.read_config(os.path.join(self.bundle_dir, "configs", "inference.json"))
+        return parser
+
+    def network(self):
+        # Both resolutions use the same SegResNet, so one calibration covers them
+        return self._parser().get_parsed_content("network_def")
+
+    def plan(self, shared, budget_s, profile, device):
+        shapes = {"highres": shared.resampled_shape(self.HIGHRES_PIXDIM),
+                  "lowres": shared.resampled_shape(self.LOWRES_PIXDIM)}
+        self.settings = choose_settings(budget_s, self.name, shapes, profile, device, threads=self.threads)
+        self.highres = self.settings["resolution"] == "highres"
+        self.pixdim = self.HIGHRES_PIXDIM if self.highres else self.LOWRES_PIXDIM
+
+    def load(self, device):
+        self.device = device
+        parser = self._parser()
+        parser["displayable_configs#highres"] = self.highres
+        if self.settings is not None:
+            parser["displayable_configs#sw_overlap"] = self.settings["overlap"]
+            parser["displayable_configs#sw_batch_size"] = self.settings["sw_batch_size"]
+        self.model = parser.get_parsed_content("network_def").to(device)
+        weights = "model.pt" if self.highres else "model_lowres.pt"
+        self.model.load_state_dict(torch.load(os.path.join(self.bundle_dir, "models", weights),
+                                              map_location=device, weights_only=True))
+        self.model.eval()
+        self.inferer = parser.get_parsed_content("inferer")
+        self.lut = btcv_lut(wholebody_ct_names(self.bundle_dir), ORGAN_LABELS)
+
+    def recipe(self):
+        return {"orientation": "RAS", "pixdim": list(self.pixdim), "mode": "bilinear",
+                "normalize": "nonzero", "scale": [-1.0, 1.0]}
+
+    def preprocess(self, shared):
+        image = shared.resampled(self.pixdim)
+        return ScaleIntensity(minv=-1.0, maxv=1.0)(NormalizeIntensity(nonzero=True)(image))
+
+    def segment(self, shared):
+        image = shared.preprocessed(self.recipe(), lambda: self.preprocess(shared))
+        with torch.no_grad():
+            logits = self.inferer(image.unsqueeze(0).to(self.device), self.model)
+            seg = torch.argmax(logits, dim=1).squeeze(0).cpu().numpy()
+        return shared.to_original(remap_labels(seg, self.lut), image)
+
+
+class TotalSegmentatorModel:
+    name = "Total Segmentator"
+    folder = "Total-Segmentator"
+    prefix = "ct_"
+    pixdim = None  # resampled inside TotalSegmentator
+    threads = 1  # resampling threads, set by run_models()
+
+    def __init__(self, fast=False):
+        self.fast = fast
+
+    def load(self, device):
+        self.device = "gpu" if device.type == "cuda" else "cpu"
+        self.lut = btcv_lut(totalsegmentator_names("total"), ORGAN_LABELS)
+
+    def segment(self, shared):
+        from totalsegmentator.python_api import totalsegmentator
+
+        output = totalsegmentator(shared.nifti(), None, ml=True, fast=self.fast, device=self.device,
+                                  roi_subset=list(BTCV_ORGAN_FILES.values()), nr_thr_resamp=self.threads,
+                                  nr_thr_saving=1, quiet=True)
+        return remap_labels(np.asanyarray(output.dataobj), self.lut)
+
+
+def run_model(model, shared, assets_dir, device, budget_s=None, profile=None):
+    """Load, segment and save one model; returns its timings."""
+    times = {}
+    if budget_s is not None and hasattr(model, "plan"):
+        try:
+            model.plan(shared, budget_s, profile, device)
+        except ValueError as e:
+            print(f"{model.name}: {e}; using the default settings")
+    start_time = time.perf_counter()
+    model.load(device)
+    times["load_s"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    seg = model.segment(shared)
+    times["inference_s"] = time.perf_counter() - start_time
+    if getattr(model, "settings", None) is not None:
+        times["settings"] = log_latency(model.settings, times["inference_s"], os.path.join(assets_dir, LATENCY_LOG))
+
+    start_time = time.perf_counter()
+    model_dir = os.path.join(assets_dir, model.folder)
+    os.makedirs(model_dir, exist_ok=True)
+    nib.save(nib.Nifti1Image(seg, shared.affine), os.path.join(model_dir, LABEL_MAP_FILE))
+    export_organ_masks(seg, shared.affine, organ_paths(model_dir, model.prefix, grouped=True))
+    volumetrics = organ_volumetrics(seg, shared.affine, ORGAN_LABELS)
+    write_report(volumetrics, os.path.join(model_dir, VOLUMETRICS_FILE))
+    times["save_s"] = time.perf_counter() - start_time
+    times["total_s"] = times["load_s"] + times["inference_s"] + times["save_s"]
+    times["organs"] = len(volumetrics)
+    print(f"{model.name}: done in {times['total_s']:.1f} s")
+    return times
+
+
+def calibrate_models(models=None, threads=None):
+    """Measure per-window forward times of the sliding-window models into the calibration profile."""
+    models = models or [SwinUNETRModel(), WholeBodyCTModel()]
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    torch.set_num_threads(threads or os.cpu_count() or 1)
+    profile = load_profile()
+    for model in models:
+        calibrate(model.network().to(device).eval(), model.name, device, profile=profile)
+    save_profile(profile)
+    return profile
+
+
+def run_models(image_path, assets_dir, models=None, threads=None, concurrent=None, store=None, cache=None,
+               crop=False, budget_s=None):
+    """
+    Segment one CT with several models, sharing the decode and resamples.
+
+    Args:
+        image_path (str): CT NIfTI.
+        assets_dir (str): Root of the model folders (e.g. Assets).
+        models (list): Model objects (default: all three).
+        threads (int): CPU threads for all models together (default: all CPUs).
+        concurrent (int): Models running at once (default: all of them).
+        cache (PreprocessCache): Preprocessed-input cache (default: the shared one).
+        crop (bool): Resample only the body box for Swin UNETR / WholeBody CT.
+        budget_s (float): Per-model sliding-window latency budget in seconds
+            (needs calibrate_models(); exact when calibrated with the
+            per-model thread count, threads // concurrent).
+
+    Returns:
+        dict: Model name -> timings (load_s, inference_s, save_s, total_s, organs).
+    """
+    models = models or [SwinUNETRModel(), WholeBodyCTModel(), TotalSegmentatorModel()]
+    threads = threads or os.cpu_count() or 1
+    concurrent = min(concurrent or len(models), len(models))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    # Split the thread budget between the models that run at the same time
+    per_model = max(1, threads // concurrent)
+    torch.set_num_threads(per_model)
+    for model in models:
+        model.threads = per_model
+    print(f"Running {len(models)} models, {concurrent} at a time, {per_model} threads each, on {device}")
+
+    start_time = time.perf_counter()
+    shared = SharedInput(image_path, store, cache or PreprocessCache(), crop)
+    decode_s = time.perf_counter() - start_time
+
+    with ThreadPoolExecutor(max_workers=concurrent) as pool:
+        profile = load_profile() if budget_s is not None else None
+        futures = {model.name: pool.submit(run_model, model, shared, assets_dir, device, budget_s, profile)
+                   for model in models}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            results[name] = {"error": str(e)}
+
+    summary = {"image": image_path, "decode_s": decode_s, "resamples": shared.resample_count,
+               "wall_s": time.perf_counter() - start_time, "threads": threads, "models": results}
+    with open(os.path.join(assets_dir, "model_times.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nDecode {decode_s:.1f} s, {shared.resample_count} resample(s), wall {summary['wall_s']:.1f} s")
+    for name, times in results.items():
+        if "error" in times:
+            print(f"  {name:<18} failed")
+        else:
+            print(f"  {name:<18} load {times['load_s']:6.1f} s   inference {times['inference_s']:7.1f} s   "
+                  f"save {times['save_s']:5.1f} s   organs {times['organs']}")
+    return results
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict((a[2:].split("=", 1) + [""])[:2] for a in sys.argv[1:] if a.startswith("--"))
+    if "calibrate" in flags:
+        calibrate_models(threads=int(args[0]) if args else None)
+        sys.exit(0)
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    run_models(args[0], args[1],
+               threads=int(args[2]) if len(args) > 2 else None,
+               concurrent=int(args[3]) if len(args) > 3 else None,
+               crop="crop" in flags,
+               store=VolumeStore() if "store" in flags else None,
+               budget_s=float(flags["budget"]) if flags.get("budget") else None)
@@ -0,0 +1,179 @@
+"""
+Sliding-window settings chosen from a per-study latency budget.
+
+A calibration profile stores, per network, the measured forward time of one
+window at each sliding-window batch size. For a study the number of windows
+follows from the (resampled) volume shape, roi size and overlap, so the
+runtime of every combination of resolution, overlap and batch size can be
+estimated before anything runs. choose_settings() takes the most accurate
+combination that fits the budget:
+
+    resolution  high-res before low-res (WholeBody CT)
+    overlap     0.5, 0.25, 0.125
+    batch size  whichever is fastest per window on this machine
+
+Calibrations are kept per CPU thread count. When a model runs with a
+count that was not calibrated (run_models.py splits the threads between
+concurrent models), the nearest calibrated count is used and its times
+scaled as if the forward pass scaled linearly with threads when fewer are
+available, and not at all when more are; the estimate errs on the slow side.
+
+    profile = load_profile()
+    settings = choose_settings(60.0, "Swin UNETR", {"highres": (239, 239, 180)}, profile,
+                               torch.device("cpu"))
+    ...
+    log_latency(settings, achieved_s, "inference_latency.jsonl")
+
+Calibrate once per machine with:
+    python "Segmentation codes/run_models.py" --calibrate
+"""
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+import torch
+
+DEFAULT_PROFILE = os.path.join(os.path.expanduser("~"), ".cache", "medical_viewer", "inference_profile.json")
+
+ROI_SIZE = (96, 96, 96)
+
+# Tried from the most to the least accurate
+OVERLAPS = (0.5, 0.25, 0.125)
+BATCH_SIZES = (1, 2, 4)
+
+
+def window_count(shape, roi_size=ROI_SIZE, overlap=0.5):
+    """Number of sliding windows monai places over a volume."""
+    count = 1
+    for size, roi in zip(shape, roi_size):
+        if size <= roi:
+            continue
+        interval = max(int(roi * (1 - overlap)), 1)
+        count *= math.ceil((size - roi) / interval) + 1
+    return count
+
+
+def resampled_shape(shape, affine, pixdim):
+    """Approximate i,j,k shape of a volume after Spacing(pixdim)."""
+    spacing = np.linalg.norm(np.asarray(affine, dtype=float)[:3, :3], axis=0)
+    return tuple(max(int(round(n * s / p)), 1) for n, s, p in zip(shape, spacing, pixdim))
+
+
+def profile_key(name, device, threads=None):
+    return f"{name}|{device}|{threads or torch.get_num_threads()} threads"
+
+
+def calibrated_threads(profile, name, device):
+    """Thread count -> profile entry of every calibration of name on device."""
+    found = {}
+    for key, entry in profile.items():
+        base, threads = key.rsplit("|", 1)
+        if base == f"{name}|{device}":
+            found[int(threads.split()[0])] = entry
+    return found
+
+
+def load_profile(path=DEFAULT_PROFILE):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(profile, path=DEFAULT_PROFILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+
+def calibrate(predictor, name, device, in_channels=1, roi_size=ROI_SIZE, batch_sizes=BATCH_SIZES,
+              repeats=2, profile=None):
+    """
+    Time one forward pass per batch size and record seconds per window.
+
+    Returns:
+        dict: The profile, updated under profile_key(name, device).
+    """
+    profile = load_profile() if profile is None else profile
+    per_window = {}
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            inputs = torch.rand((batch_size, in_channels) + tuple(roi_size), device=device)
+            predictor(inputs)  # warm-up
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                predictor(inputs)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            per_window[str(batch_size)] = (time.perf_counter() - start_time) / (repeats * batch_size)
+            print(f"{name}: batch {batch_size}, {per_window[str(batch_size)]:.3f} s per window")
+    profile[profile_key(name, device)] = {"roi_size": list(roi_size), "per_window_s": per_window}
+    return profile
+
+
+def choose_settings(budget_s, name, shapes, profile, device, overlaps=OVERLAPS, threads=None):
+    """
+    Most accurate sliding-window settings expected to finish within budget_s.
+
+    Args:
+        budget_s (float): Latency budget for the forward passes, in seconds.
+        name (str): Network name used at calibration.
+        shapes (dict): Resolution name -> resampled i,j,k shape, best first.
+        profile (dict): Calibration profile (see calibrate).
+        device (torch.device): Device the model runs on.
+        threads (int): CPU threads the model runs with (default: torch's current count).
+
+    Returns:
+        dict: resolution, roi_size, overlap, sw_batch_size, windows,
+        estimated_s, budget_s and within_budget. If nothing fits, the
+        fastest combination is returned with within_budget False.
+    """
+    threads = threads or torch.get_num_threads()
+    entries = calibrated_threads(profile, name, device)
+    if not entries:
+        raise ValueError(f"No calibration for {name} on {device}; run run_models.py --calibrate first")
+    nearest = min(entries, key=lambda n: (abs(n - threads), -n))
+    entry = entries[nearest]
+    roi_size = tuple(entry["roi_size"])
+    batch_size, per_window_s = min(entry["per_window_s"].items(), key=lambda item: item[1])
+    if nearest != threads:
+        per_window_s *= max(nearest / threads, 1.0)
+        print(f"{name}: calibrated with {nearest} threads, running with {threads}; "
+              f"{per_window_s:.3f} s per window assumed")
+
+    candidates = []
+    for resolution, shape in shapes.items():
+        for overlap in overlaps:
+            windows = window_count(shape, roi_size, overlap)
+            candidates.append({
+                "model": name,
+                "threads": threads,
+                "resolution": resolution,
+                "roi_size": list(roi_size),
+                "overlap": overlap,
+                "sw_batch_size": int(batch_size),
+                "windows": windows,
+                "estimated_s": windows * per_window_s,
+                "budget_s": budget_s,
+            })
+    fitting = [c for c in candidates if c["estimated_s"] <= budget_s]
+    settings = fitting[0] if fitting else min(candidates, key=lambda c: c["estimated_s"])
+    settings["within_budget"] = bool(fitting)
+    print(f"{name}: {settings['resolution']}, overlap {settings['overlap']}, batch {settings['sw_batch_size']}, "
+          f"{settings['windows']} windows, ~{settings['estimated_s']:.1f} s of a {budget_s:.1f} s budget"
+          + ("" if fitting else " (nothing fits; fastest settings used)"))
+    return settings
+
+
+def log_latency(settings, achieved_s, path):
+    """Print the achieved latency and append it, with the settings, to a JSON-lines log."""
+    record = dict(settings, achieved_s=achieved_s, time=time.strftime("%Y-%m-%d %H:%M:%S"))
+    print(f"{settings['model']}: {achieved_s:.1f} s achieved (estimated {settings['estimated_s']:.1f} s, "
+          f"budget {settings['budget_s']:.1f} s)")
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
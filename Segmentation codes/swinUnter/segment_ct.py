@@ -4,6 +4,8 @@ Segments 13 abdominal organs from CT scan
 """
 
 import os
+import sys
+import time
 import torch
 import nibabel as nib
 import numpy as np
@@ -17,8 +19,20 @@ from monai.transforms import (
     Spacing,
     ScaleIntensityRange,
     EnsureType,
+    SpatialResample,
 )
 from monai.inferers import sliding_window_inference
+from monai.data import MetaTensor
+from window_inference import parallel_sliding_window_inference
+from inference_budget import choose_settings, load_profile, log_latency
+
+# Memory-mapped volume store shared with the GUI (gui/volume_store.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "gui"))
+from volume_store import VolumeStore
+from preprocess_cache import PreprocessCache
+from resampling import foreground_bbox
+from label_export import export_organ_masks, organ_paths
+from volumetrics import organ_volumetrics, write_report
 
 # Organ labels for BTCV dataset
 ORGAN_LABELS = {
@@ -38,10 +52,30 @@ ORGAN_LABELS = {
     13: "Left Adrenal Gland",
 }
 
+# preprocess_ct's chain, also the PreprocessCache key of its output
+PREPROCESS_RECIPE = {
+    "orientation": "RAS",
+    "pixdim": [1.5, 1.5, 2.0],
+    "mode": "bilinear",
+    "intensity_range": [-175, 250, 0.0, 1.0],
+    "clip": True,
+}
 
-def load_model(model_path, device):
-    """Load the Swin UNETR model with pretrained weights."""
-    model = SwinUNETR(
+# Sliding-window settings of run_inference unless a latency budget chooses others
+INFERENCE_SETTINGS = {"roi_size": [96, 96, 96], "sw_batch_size": 4, "overlap": 0.5, "skip_empty": False}
+
+# skip_empty: windows with at most `fraction` of their voxels above `level`
+# (ScaleIntensityRange output; 0.0 is -175 HU or less, i.e. air) are not
+# run through the model and count as background
+EMPTY_WINDOW = {"level": 0.0, "fraction": 0.001}
+
+# preprocess_ct(crop=True): body box found on the native grid before resampling
+BODY_CROP = {"threshold_hu": -500, "margin_mm": 10.0}
+
+
+def build_network():
+    """The BTCV Swin UNETR architecture (random weights)."""
+    return SwinUNETR(
         in_channels=1,
         out_channels=14,
         feature_size=48,
@@ -50,6 +84,11 @@ def load_model(model_path, device):
         use_checkpoint=False,
         spatial_dims=3,
     )
+
+
+def load_model(model_path, device):
+    """Load the Swin UNETR model with pretrained weights."""
+    model = build_network()
     
     # Load pretrained weights
     checkpoint = torch.load(model_path, map_location=device, weights_only=False)
@@ -74,38 +113,153 @@ def load_model(model_path, device):
     return model
 
 
-def preprocess_ct(image_path):
-    """Preprocess CT scan for inference."""
+def cached_input(cache, image_path, recipe):
+    """A preprocessed model input from a PreprocessCache (channel-first MetaTensor), or None."""
+    cached = cache.get(image_path, recipe)
+    if cached is None:
+        return None
+    array, affine = cached
+    print(f"Preprocessed CT {array.shape} read from cache")
+    return MetaTensor(torch.from_numpy(array), affine=torch.as_tensor(affine),
+                      meta={"filename_or_obj": image_path})
+
+
+def cache_input(cache, image_path, recipe, image):
+    """Store a preprocessed model input (channel-first MetaTensor) in a PreprocessCache."""
+    cache.put(image_path, recipe, image.detach().cpu().numpy(), image.affine.cpu().numpy())
+
+
+def body_crop(array, affine, threshold_hu=BODY_CROP["threshold_hu"], margin_mm=BODY_CROP["margin_mm"]):
+    """
+    Bounding box of the body (voxels above threshold_hu) on the native grid.
+
+    Args:
+        array (np.ndarray): CT in HU, i,j,k order.
+        affine (np.ndarray): Its 4x4 voxel-to-world affine.
+
+    Returns:
+        dict: Crop record: "shape" of the original grid, "box" ([start, stop]
+        per i,j,k axis, margin included) and "affine" of the cropped grid.
+    """
+    affine = np.asarray(affine, dtype=float)
+    shape = array.shape[-3:]
+    found = foreground_bbox(np.asarray(array) > threshold_hu, pad=0)
+    start, stop = found if found is not None else ((0, 0, 0), shape)
+    margin = np.ceil(margin_mm / np.linalg.norm(affine[:3, :3], axis=0)).astype(int)
+    box = [[max(int(a - m), 0), min(int(b + m), int(n))] for a, b, m, n in zip(start, stop, margin, shape)]
+    cropped_affine = affine.copy()
+    cropped_affine[:3, 3] = (affine @ np.array([a for a, _ in box] + [1.0]))[:3]
+    return {"shape": [int(n) for n in shape], "box": box, "affine": cropped_affine.tolist()}
+
+
+def crop_slices(record):
+    """The record's crop box as i,j,k slices."""
+    return tuple(slice(a, b) for a, b in record["box"])
+
+
+def crop_to_original(segmentation, processed, record):
+    """
+    Invert a body crop: nearest-neighbour resample of a label volume on the
+    preprocessed grid onto the crop box, pasted into the original grid
+    (background outside the box).
+    """
+    box_shape = [b - a for a, b in record["box"]]
+    seg = MetaTensor(torch.as_tensor(np.asarray(segmentation)[None]), affine=processed.affine)
+    seg = SpatialResample(mode="nearest")(seg, dst_affine=torch.as_tensor(record["affine"]),
+                                          spatial_size=box_shape)
+    restored = np.zeros(record["shape"], dtype=np.int16)
+    restored[crop_slices(record)] = seg[0].numpy().astype(np.int16)
+    return restored
+
+
+def preprocess_ct(image_path, store=None, cache=None, crop=False):
+    """Preprocess CT scan for inference.
+
+    With a VolumeStore the CT comes from its memory-mapped copy (same i,j,k
+    order and RAS affine as ITKReader) instead of being decompressed again.
+    With a PreprocessCache a CT already preprocessed with PREPROCESS_RECIPE
+    is read back (float16 precision) instead of being resampled again.
+
+    With crop=True only the body box (see body_crop) is resampled; its crop
+    record is returned in processed.meta["crop"] for crop_to_original().
+    """
+    a_min, a_max, b_min, b_max = PREPROCESS_RECIPE["intensity_range"]
     transforms = Compose([
-        LoadImage(image_only=True, reader="ITKReader"),
-        EnsureChannelFirst(),
-        Orientation(axcodes="RAS"),
-        Spacing(pixdim=(1.5, 1.5, 2.0), mode="bilinear"),
-        ScaleIntensityRange(a_min=-175, a_max=250, b_min=0.0, b_max=1.0, clip=True),
+        EnsureChannelFirst(channel_dim="no_channel"),
+        Orientation(axcodes=PREPROCESS_RECIPE["orientation"]),
+        Spacing(pixdim=PREPROCESS_RECIPE["pixdim"], mode=PREPROCESS_RECIPE["mode"]),
+        ScaleIntensityRange(a_min=a_min, a_max=a_max, b_min=b_min, b_max=b_max,
+                            clip=PREPROCESS_RECIPE["clip"]),
         EnsureType(),
     ])
+    recipe = dict(PREPROCESS_RECIPE, crop=BODY_CROP) if crop else PREPROCESS_RECIPE
     
-    # Also load the original image for metadata
-    loader = LoadImage(image_only=False, reader="ITKReader")
-    original_data = loader(image_path)
+    if store is not None:
+        volume = store.open(image_path)
+        original_data = MetaTensor(
+            torch.from_numpy(np.asarray(volume.ijk_array(), dtype=np.float32)),
+            affine=torch.as_tensor(volume.affine),
+            meta={"filename_or_obj": image_path},
+        )
+        original = original_data
+    else:
+        # Decoded once; the tensor also feeds the transforms
+        original_data = LoadImage(image_only=False, reader="ITKReader")(image_path)
+        original = original_data[0]
     
-    processed = transforms(image_path)
+    record = None
+    source = original
+    if crop:
+        record = body_crop(original.as_tensor().numpy(), original.affine.numpy())
+        source = MetaTensor(original.as_tensor()[crop_slices(record)],
+                            affine=torch.as_tensor(record["affine"]), meta={"filename_or_obj": image_path})
+        print(f"Body crop {[b - a for a, b in record['box']]} of {record['shape']} voxels")
+    
+    processed = cached_input(cache, image_path, recipe) if cache is not None else None
+    if processed is None:
+        processed = transforms(source)
+        if cache is not None:
+            cache_input(cache, image_path, recipe, processed)
+    if record is not None:
+        processed.meta["crop"] = record
     return processed, original_data
 
 
-def run_inference(model, image, device):
-    """Run sliding window inference on the CT scan."""
+def run_inference(model, image, device, workers=None, settings=None):
+    """Run sliding window inference on the CT scan.
+
+    MONAI's sliding_window_inference by default. On the CPU, workers > 1
+    splits the windows over that many processes, and skip_empty skips the
+    forward pass of air-only windows; both go through window_inference.py,
+    whose window grid and blending maps are cached per volume shape.
+    settings overrides INFERENCE_SETTINGS (roi_size, sw_batch_size,
+    overlap, skip_empty), e.g. from choose_settings().
+    """
+    settings = dict(INFERENCE_SETTINGS, **(settings or {}))
+    parallel = bool(workers and workers > 1 and device.type == "cpu")
     with torch.no_grad():
         image = image.unsqueeze(0).to(device)  # Add batch dimension
         
         # Sliding window inference
-        outputs = sliding_window_inference(
-            inputs=image,
-            roi_size=(96, 96, 96),
-            sw_batch_size=4,
-            predictor=model,
-            overlap=0.5,
-        )
+        if parallel or settings["skip_empty"]:
+            outputs = parallel_sliding_window_inference(
+                inputs=image.as_tensor() if isinstance(image, MetaTensor) else image,
+                roi_size=tuple(settings["roi_size"]),
+                sw_batch_size=settings["sw_batch_size"],
+                predictor=model,
+                overlap=settings["overlap"],
+                workers=workers if parallel else 1,
+                empty_level=EMPTY_WINDOW["level"] if settings["skip_empty"] else None,
+                empty_fraction=EMPTY_WINDOW["fraction"],
+            )
+        else:
+            outputs = sliding_window_inference(
+                inputs=image,
+                roi_size=tuple(settings["roi_size"]),
+                sw_batch_size=settings["sw_batch_size"],
+                predictor=model,
+                overlap=settings["overlap"],
+            )
         
         # Apply softmax and get argmax for segmentation
         outputs = torch.softmax(outputs, dim=1)
@@ -149,6 +303,17 @@ def main():
     input_ct_path = os.path.join(base_dir, "ct (2).nii.gz")
     output_path = os.path.join(base_dir, "segmentation_output.nii.gz")
     
+    # Decode the CT once into the memory-mapped store (~/.cache); reruns skip the gunzip
+    use_volume_store = False
+    store = VolumeStore() if use_volume_store else None
+    # Preprocessed tensors are cached too; reruns (other checkpoint, overlap) skip resampling
+    cache = PreprocessCache()
+    # True: resample only the body box; labels are pasted back onto the full grid
+    crop = False
+    # Seconds for the sliding-window passes (None: INFERENCE_SETTINGS);
+    # needs a calibration profile (run_models.py --calibrate)
+    latency_budget = None
+    
     # Check if GPU is available
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
@@ -160,29 +325,31 @@ def main():
     
     # Preprocess CT scan
     print(f"Loading and preprocessing CT scan: {input_ct_path}")
-    processed_ct, original_data = preprocess_ct(input_ct_path)
+    processed_ct, original_data = preprocess_ct(input_ct_path, store, cache, crop)
     print(f"Preprocessed CT shape: {processed_ct.shape}")
     
     # Run inference
+    settings = None
+    if latency_budget is not None:
+        settings = choose_settings(latency_budget, "Swin UNETR", {"highres": tuple(processed_ct.shape[1:])},
+                                   load_profile(), device)
     print("Running segmentation (this may take a few minutes)...")
-    segmentation = run_inference(model, processed_ct, device)
+    start_time = time.perf_counter()
+    segmentation = run_inference(model, processed_ct, device, settings=settings)
+    if settings is not None:
+        log_latency(settings, time.perf_counter() - start_time, output_path.replace(".nii.gz", "_latency.jsonl"))
     print(f"Segmentation complete! Shape: {segmentation.shape}")
     
-    # Print detected organs
-    unique_labels = np.unique(segmentation)
-    print("\nDetected organs:")
-    for label in unique_labels:
-        if label in ORGAN_LABELS:
-            count = np.sum(segmentation == label)
-            print(f"  {label}: {ORGAN_LABELS[label]} ({count} voxels)")
-    
-    # Load original NIfTI for shape and affine
-    original_nifti = nib.load(input_ct_path)
-    original_shape = original_nifti.shape
+    # Original shape and affine (from the stored copy or the header, nothing is decoded)
+    original_nifti = store.open(input_ct_path) if store is not None else nib.load(input_ct_path)
+    original_shape = original_nifti.ijk_array().shape if store is not None else original_nifti.shape
     
     # Resample segmentation to match original CT dimensions
     print(f"\nResampling segmentation from {segmentation.shape} to {original_shape}...")
-    segmentation_resampled = resample_to_original(segmentation, original_shape)
+    if "crop" in processed_ct.meta:
+        segmentation_resampled = crop_to_original(segmentation, processed_ct, processed_ct.meta["crop"])
+    else:
+        segmentation_resampled = resample_to_original(segmentation, original_shape)
     print(f"Resampled segmentation shape: {segmentation_resampled.shape}")
     
     # Verify labels are preserved after resampling
@@ -192,6 +359,18 @@ def main():
     # Save segmentation with original affine
     save_segmentation(segmentation_resampled, original_nifti, output_path)
     
+    # Detected organs: voxels, volume, bounding box and centroid in one report
+    volumetrics = organ_volumetrics(segmentation_resampled, original_nifti.affine, ORGAN_LABELS)
+    print("\nDetected organs:")
+    for row in volumetrics:
+        print(f"  {row['Label']}: {row['Organ']} ({row['Voxels']} voxels, {row['Volume_ml']:.1f} ml)")
+    report_path = write_report(volumetrics, output_path.replace(".nii.gz", "_volumetrics.csv"))
+    print(f"Volumetrics saved to: {report_path}")
+    
+    # One mask per organ in the GUI's Assets/<Model>/<Organ>/ layout
+    print("\nExporting per-organ masks...")
+    export_organ_masks(segmentation_resampled, original_nifti.affine, organ_paths(base_dir, grouped=True))
+    
     print("\n[SUCCESS] Segmentation complete!")
     print(f"Output saved to: {output_path}")
     print(f"Segmentation dimensions match original CT: {segmentation_resampled.shape}")
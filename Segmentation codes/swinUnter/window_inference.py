@@ -0,0 +1,278 @@
+"""
+Sliding-window inference with the window grid split across processes.
+
+A single monai sliding_window_inference call only scales as far as torch's
+intra-op threads do. Here the windows are sorted along the last (k) axis
+and split into one contiguous run per worker process. Every worker gets the
+model through shared memory (model.share_memory(), no copy of the
+weights), runs its windows with its share of the CPU threads, and returns
+the importance-weighted logits over the box its windows cover. The boxes
+overlap where neighbouring partitions' windows overlap; summing them into
+one accumulator before dividing blends those borders exactly as a single
+call would. A worker that fails sends its traceback back instead, and a
+worker that dies without a result is noticed within WORKER_POLL_S; both
+raise RuntimeError in the caller.
+
+    logits = parallel_sliding_window_inference(image, (96, 96, 96), 4, model,
+                                               overlap=0.5, workers=8)
+
+The window grid, blending weights and their per-voxel sum (the
+normalisation map) only depend on the volume shape, roi size, overlap and
+blend mode. They are held in an InferencePlan, and plan_for() keeps the
+last few plans, so a batch of same-protocol scans builds them once.
+
+With empty_level set, windows whose voxels are (almost) all at or below
+that intensity (air after ScaleIntensityRange clipping) skip the forward
+pass. They drop out of the normalisation map; voxels that only empty
+windows cover are background.
+
+The result matches sliding_window_inference up to float summation order.
+"""
+
+import os
+import queue as queue_module
+import time
+import traceback
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.nn.functional as F
+from monai.data.utils import compute_importance_map, dense_patch_slices
+
+
+def scan_interval(image_size, roi_size, overlap):
+    """Window stride per axis (as monai's sliding_window_inference)."""
+    interval = []
+    for size, roi in zip(image_size, roi_size):
+        if roi == size:
+            interval.append(roi)
+        else:
+            interval.append(max(int(roi * (1 - overlap)), 1))
+    return tuple(interval)
+
+
+def importance_map(roi_size, mode="constant", sigma_scale=0.125):
+    """Blending weights of one window, zeros clamped as monai does."""
+    weights = compute_importance_map(roi_size, mode=mode, sigma_scale=sigma_scale, device="cpu").float()
+    min_non_zero = max(weights[weights != 0].min().item(), 1e-3)
+    return torch.clamp(weights, min=min_non_zero)
+
+
+class InferencePlan:
+    """Window grid, importance map and normalisation map for one volume shape."""
+
+    def __init__(self, image_size, roi_size, overlap, mode="constant", sigma_scale=0.125):
+        self.image_size = tuple(image_size)
+        self.roi_size = tuple(roi_size)
+
+        # Pad up to the window size like monai (symmetric, constant 0), in F.pad order
+        self.pad = []
+        for size, roi in reversed(list(zip(self.image_size, self.roi_size))):
+            diff = max(roi - size, 0)
+            self.pad.extend([diff // 2, diff - diff // 2])
+        self.padded_size = tuple(size + self.pad[2 * (2 - n)] + self.pad[2 * (2 - n) + 1]
+                                 for n, size in enumerate(self.image_size))
+
+        self.windows = dense_patch_slices(self.padded_size, self.roi_size,
+                                          scan_interval(self.padded_size, self.roi_size, overlap))
+        self.weights = importance_map(self.roi_size, mode, sigma_scale)
+        self.count = torch.zeros((1, 1) + self.padded_size)
+        for w in self.windows:
+            self.count[(slice(None), slice(None)) + w] += self.weights
+        self._on_device = {}
+
+    def on(self, device):
+        """(weights, count) on a device, moved there once."""
+        device = torch.device(device)
+        if device not in self._on_device:
+            self._on_device[device] = (self.weights.to(device), self.count.to(device))
+        return self._on_device[device]
+
+    def pad_input(self, inputs):
+        return F.pad(inputs, self.pad) if any(self.pad) else inputs
+
+    def crop_output(self, logits):
+        crop = tuple(slice(self.pad[2 * n], self.pad[2 * n] + size)
+                     for n, size in enumerate(reversed(self.image_size)))[::-1]
+        return logits[(slice(None), slice(None)) + crop]
+
+    def partition(self, parts):
+        """Split the windows into `parts` contiguous runs along the last axis."""
+        ordered = sorted(self.windows, key=lambda w: tuple(s.start for s in reversed(w)))
+        bounds = np.linspace(0, len(ordered), parts + 1).astype(int)
+        return [ordered[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+# Plans kept for reuse (batches of scans usually share a handful of shapes)
+MAX_CACHED_PLANS = 4
+_plans = OrderedDict()
+
+
+def plan_for(image_size, roi_size, overlap, mode="constant", sigma_scale=0.125):
+    """The InferencePlan for these settings, built once and reused."""
+    key = (tuple(image_size), tuple(roi_size), float(overlap), str(mode), float(sigma_scale))
+    if key in _plans:
+        _plans.move_to_end(key)
+        return _plans[key]
+    start_time = time.perf_counter()
+    plan = InferencePlan(*key)
+    _plans[key] = plan
+    while len(_plans) > MAX_CACHED_PLANS:
+        _plans.popitem(last=False)
+    print(f"Inference plan for {key[0]}: {len(plan.windows)} windows, built in "
+          f"{(time.perf_counter() - start_time) * 1000.0:.0f} ms")
+    return plan
+
+
+def is_empty_window(patch, empty_level, empty_fraction=0.0):
+    """True if at most empty_fraction of the patch's voxels are above empty_level."""
+    return torch.count_nonzero(patch > empty_level).item() <= empty_fraction * patch.numel()
+
+
+def infer_windows(image, windows, sw_batch_size, predictor, weights, empty_level=None, empty_fraction=0.0):
+    """
+    Weighted logits of a run of windows, accumulated over their bounding box only.
+
+    Returns:
+        tuple: (origin, logits sum or None if every window was empty, skipped
+        windows); the sum covers the box of the windows run, starting at the
+        i,j,k origin.
+    """
+    skipped = []
+    if empty_level is not None:
+        skipped = [w for w in windows
+                   if is_empty_window(image[(slice(None), slice(None)) + w], empty_level, empty_fraction)]
+        windows = [w for w in windows if w not in skipped]
+    if not windows:
+        return None, None, skipped
+    origin = tuple(min(w[axis].start for w in windows) for axis in range(3))
+    box_shape = tuple(max(w[axis].stop for w in windows) - origin[axis] for axis in range(3))
+    logits = None
+    with torch.no_grad():
+        for start in range(0, len(windows), sw_batch_size):
+            batch = windows[start:start + sw_batch_size]
+            outputs = predictor(torch.cat([image[(slice(None), slice(None)) + w] for w in batch]))
+            if logits is None:
+                logits = torch.zeros((1, outputs.shape[1]) + box_shape, device=outputs.device)
+            for w, output in zip(batch, outputs):
+                local = (slice(None), slice(None)) + tuple(slice(s.start - o, s.stop - o) for s, o in zip(w, origin))
+                logits[local] += output.float() * weights
+    return origin, logits, skipped
+
+
+# Seconds between checks that no worker died without sending its result
+WORKER_POLL_S = 1.0
+
+
+def _worker(queue, received, index, image, windows, sw_batch_size, predictor, weights, threads,
+            empty_level, empty_fraction):
+    try:
+        torch.set_num_threads(threads)
+        queue.put((index, infer_windows(image, windows, sw_batch_size, predictor, weights,
+                                        empty_level, empty_fraction)))
+    except Exception:
+        queue.put((index, traceback.format_exc()))
+    # The boxes are passed as shared memory; stay alive until the parent has them
+    received.wait()
+
+
+def _collect(queue, processes):
+    """Every worker's infer_windows result, in worker order; RuntimeError if one fails or dies."""
+    results = {}
+    while len(results) < len(processes):
+        try:
+            index, result = queue.get(timeout=WORKER_POLL_S)
+        except queue_module.Empty:
+            for index, process in enumerate(processes):
+                if index not in results and process.exitcode is not None:
+                    raise RuntimeError(f"Inference worker {index} exited with code {process.exitcode} "
+                                       f"without returning its windows")
+            continue
+        if isinstance(result, str):
+            raise RuntimeError(f"Inference worker {index} failed:\n{result}")
+        results[index] = result
+    return [results[index] for index in range(len(processes))]
+
+
+def parallel_sliding_window_inference(inputs, roi_size, sw_batch_size, predictor, overlap=0.25,
+                                      mode="constant", sigma_scale=0.125, workers=None, threads=None,
+                                      empty_level=None, empty_fraction=0.0):
+    """
+    sliding_window_inference with the windows split over worker processes.
+
+    Args:
+        inputs (torch.Tensor): 1 x C x I x J x K image (on the CPU when workers > 1).
+        roi_size (tuple): Window size.
+        sw_batch_size (int): Windows per forward pass (in each worker).
+        predictor (torch.nn.Module): Model in eval mode.
+        overlap (float): Window overlap, 0-1.
+        mode (str): Blending, "constant" or "gaussian".
+        workers (int): Worker processes (default: one per 4 CPUs; 1 runs in this process).
+        threads (int): Total CPU threads shared by the workers (default: all CPUs).
+        empty_level (float): Skip windows with at most empty_fraction of their
+            voxels above this intensity (None: run every window).
+        empty_fraction (float): See empty_level.
+
+    Returns:
+        torch.Tensor: 1 x classes x I x J x K logits.
+    """
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, workers or threads // 4)
+    per_worker = max(1, threads // workers)
+
+    plan = plan_for(inputs.shape[2:], roi_size, overlap, mode, sigma_scale)
+    image = plan.pad_input(inputs)
+    weights, count = plan.on(image.device)
+    runs = plan.partition(workers)
+
+    start_time = time.perf_counter()
+    if len(runs) == 1:
+        results = [infer_windows(image, runs[0], sw_batch_size, predictor, weights, empty_level, empty_fraction)]
+    else:
+        predictor.share_memory()
+        image = image.contiguous().share_memory_()
+        context = mp.get_context("spawn")
+        queue = context.Queue()
+        received = context.Event()
+        processes = [context.Process(target=_worker, args=(queue, received, i, image, run, sw_batch_size,
+                                                           predictor, weights, per_worker, empty_level,
+                                                           empty_fraction))
+                     for i, run in enumerate(runs)]
+        for process in processes:
+            process.start()
+        failed = True
+        try:
+            results = _collect(queue, processes)
+            failed = False
+        finally:
+            # Release the waiting workers before terminating any (set() waits for its sleepers)
+            received.set()
+            for process in processes:
+                if failed:
+                    process.terminate()
+                process.join()
+
+    # Merge the boxes (overlapping borders are summed), then normalise
+    classes = max([r[1].shape[1] for r in results if r[1] is not None], default=1)
+    logits = torch.zeros((1, classes) + plan.padded_size, device=image.device)
+    for origin, box_logits, _ in results:
+        if box_logits is not None:
+            logits[(slice(None), slice(None)) + tuple(slice(o, o + n) for o, n in
+                                                      zip(origin, box_logits.shape[2:]))] += box_logits
+    skipped = [w for _, _, run_skipped in results for w in run_skipped]
+    if skipped:
+        # Empty windows leave the normalisation; what only they cover is background
+        count = count.clone()
+        for w in skipped:
+            count[(slice(None), slice(None)) + w] -= weights
+        # Any window still covering a voxel adds at least weights.min()
+        uncovered = count[:, 0] < weights.min() / 2
+        count = count.clamp(min=weights.min().item() / 2)
+    logits /= count
+    if skipped:
+        logits[:, 0][uncovered] = 1.0
+    print(f"{len(plan.windows) - len(skipped)} of {len(plan.windows)} windows run ({len(skipped)} empty) on "
+          f"{len(runs)} worker(s) x {per_worker} thread(s) in {time.perf_counter() - start_time:.2f} s")
+    return plan.crop_output(logits)
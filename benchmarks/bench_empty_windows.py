@@ -0,0 +1,104 @@
+"""
+Benchmark and guard: skipping empty sliding windows in run_inference.
+
+Segments one CT with Swin UNETR twice, with every window run and with
+skip_empty (segment_ct.EMPTY_WINDOW), and reports:
+
+    windows    how many windows were found empty (forward passes saved)
+    latency    run_inference wall time of both runs
+    Dice       of both label maps against every Assets/Ground-Truths structure
+
+Exits with status 1 if any structure's Dice moves by more than
+DICE_TOLERANCE, so it can guard changes to the empty-window rule. The
+ground truths must be on the CT's grid (the CT the Assets were made from).
+
+Run from the repository root:
+    python benchmarks/bench_empty_windows.py ct.nii.gz [model.pt]
+"""
+
+import glob
+import os
+import sys
+import time
+
+import nibabel as nib
+import numpy as np
+import torch
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Segmentation codes", "swinUnter"))
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from segment_ct import (  # noqa: E402
+    EMPTY_WINDOW,
+    INFERENCE_SETTINGS,
+    load_model,
+    preprocess_ct,
+    resample_to_original,
+    run_inference,
+)
+from label_export import BTCV_ORGAN_FILES  # noqa: E402
+from volume_store import VolumeStore  # noqa: E402
+from window_inference import is_empty_window, plan_for  # noqa: E402
+
+MODEL_PATH = os.path.join(ROOT, "Segmentation codes", "swinUnter", "swin_unetr_btcv_segmentation", "models",
+                          "model.pt")
+DICE_TOLERANCE = 1e-3
+
+
+def dice(a, b):
+    total = np.count_nonzero(a) + np.count_nonzero(b)
+    return 2.0 * np.count_nonzero(a & b) / total if total else 1.0
+
+
+def count_empty_windows(image):
+    plan = plan_for(image.shape[1:], INFERENCE_SETTINGS["roi_size"], INFERENCE_SETTINGS["overlap"])
+    padded = plan.pad_input(torch.as_tensor(image)[None])
+    empty = sum(is_empty_window(padded[(slice(None), slice(None)) + w], EMPTY_WINDOW["level"],
+                                EMPTY_WINDOW["fraction"]) for w in plan.windows)
+    return empty, len(plan.windows)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    ct_path = sys.argv[1]
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    store = VolumeStore()
+    model = load_model(sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH, device)
+    image, _ = preprocess_ct(ct_path, store)
+    original_shape = store.open(ct_path).ijk_array().shape
+
+    empty, windows = count_empty_windows(image)
+    labels, times = {}, {}
+    for skip in (False, True):
+        start = time.perf_counter()
+        seg = run_inference(model, image, device, settings={"skip_empty": skip})
+        times[skip] = time.perf_counter() - start
+        labels[skip] = resample_to_original(seg, original_shape)
+
+    print(f"\nEmpty windows  {empty} of {windows} ({100.0 * empty / windows:.1f}% of forward passes saved)")
+    print(f"all windows    {times[False]:7.1f} s")
+    print(f"skip empty     {times[True]:7.1f} s   x{times[False] / times[True]:.2f}")
+    print(f"Voxels that differ: {int(np.count_nonzero(labels[False] != labels[True]))}\n")
+
+    file_labels = {name: label for label, name in BTCV_ORGAN_FILES.items()}
+    worst = 0.0
+    print(f"{'Structure':<32}{'all':>8}{'skip':>8}{'change':>10}")
+    for path in sorted(glob.glob(os.path.join(ROOT, "Assets", "Ground-Truths", "*", "*.nii.gz"))):
+        name = os.path.basename(path)[:-len(".nii.gz")]
+        gt = np.asanyarray(nib.load(path).dataobj) > 0
+        if gt.shape != original_shape:
+            print(f"{name:<32}ground truth {gt.shape} is not on the CT grid {original_shape}")
+            sys.exit(2)
+        before = dice(labels[False] == file_labels[name], gt)
+        after = dice(labels[True] == file_labels[name], gt)
+        worst = max(worst, abs(after - before))
+        print(f"{name:<32}{before:8.4f}{after:8.4f}{after - before:+10.5f}")
+
+    print(f"\nLargest Dice change {worst:.5f} (tolerance {DICE_TOLERANCE})")
+    sys.exit(0 if worst <= DICE_TOLERANCE else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: GUI cold launch to an interactive selection screen.
+
+Each run starts a fresh interpreter (so nothing is cached in sys.modules),
+creates MedicalWorkspace, shows it and processes the first events.
+"eager" first imports pandas and viewer_3d, as gui.py did at module load;
+"lazy" is the current startup path, where those are warmed in the
+background after the window is shown. "3D ready" is when VTK3DViewer can
+be created without waiting on an import.
+
+Run from the repository root (uses the offscreen Qt platform when there is
+no display):
+    python benchmarks/bench_gui_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+GUI_DIR = os.path.abspath(os.path.join(ROOT, "gui"))
+
+# Prefix of the child's result line (the warm-up thread prints to stdout too)
+RESULT_TAG = "BENCH_RESULT "
+
+CHILD = r"""
+import json, sys, threading, time
+start = time.perf_counter()
+sys.path.insert(0, {gui_dir!r})
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+if {eager}:
+    import pandas, viewer_3d  # the old module-level imports
+import gui
+window = gui.MedicalWorkspace()
+window.show()
+app.processEvents()
+interactive = time.perf_counter() - start
+if not {eager}:
+    gui.warm_heavy_modules()
+gui.load_viewer_class()  # blocks until the 3D stack is importable
+ready = time.perf_counter() - start
+for thread in threading.enumerate():
+    if thread.name == "module-warmup":
+        thread.join()  # let its message out first
+sys.stdout.write({tag!r} + json.dumps({{"interactive": interactive, "ready": ready}}) + "\n")
+"""
+
+
+def run(eager):
+    env = dict(os.environ)
+    if not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    code = CHILD.format(gui_dir=GUI_DIR, eager=eager, tag=RESULT_TAG)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=GUI_DIR)
+    for line in out.stdout.splitlines()[::-1]:
+        if line.startswith(RESULT_TAG):
+            return json.loads(line[len(RESULT_TAG):])
+    raise RuntimeError(out.stderr)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, eager in (("eager imports", True), ("lazy startup", False)):
+        results = [run(eager) for _ in range(runs)]
+        interactive = statistics.median(r["interactive"] for r in results) * 1000.0
+        ready = statistics.median(r["ready"] for r in results) * 1000.0
+        print(f"{label:<14} interactive {interactive:8.1f} ms   3D ready {ready:8.1f} ms   (median of {runs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: MRIViewer hollow shell (binary_erosion + XOR) vs gui/hollow_shell.py.
+
+For each mask, the original whole-volume erosion is timed for several wall
+thicknesses and compared voxel for voxel with HollowShell, which computes its
+cropped distance field once and then only thresholds.
+
+Run from the repository root:
+    python benchmarks/bench_hollow_shell.py [mask.nii.gz ...]
+"""
+
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.ndimage as ndimage
+import SimpleITK as sitk
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from hollow_shell import HollowShell  # noqa: E402
+
+THICKNESSES = (1, 2, 3, 5)
+
+
+def erosion_shell(mask, wall_thickness):
+    """The original generate_3d_mesh hollowing."""
+    struct = ndimage.generate_binary_structure(3, 1)
+    eroded_mask = ndimage.binary_erosion(mask, structure=struct, iterations=wall_thickness)
+    return mask ^ eroded_mask
+
+
+def main():
+    files = sys.argv[1:] or sorted(glob.glob(os.path.join(ROOT, "Assets", "SwinUnter", "*", "*.nii.gz")))[:4]
+    for path in files:
+        mask = sitk.GetArrayFromImage(sitk.ReadImage(path)) > 0
+        print(f"\n{os.path.relpath(path, ROOT)}  {mask.shape}  {int(mask.sum())} foreground voxels")
+
+        shell = HollowShell(mask)
+        print(f"  distance field (once)      {shell.elapsed_ms:9.1f} ms")
+
+        for t in THICKNESSES:
+            start = time.perf_counter()
+            reference = erosion_shell(mask, t)
+            erosion_ms = (time.perf_counter() - start) * 1000.0
+
+            start = time.perf_counter()
+            cropped = shell.shell(t)
+            threshold_ms = (time.perf_counter() - start) * 1000.0
+
+            full = np.zeros(mask.shape, dtype=bool)
+            if cropped is not None:
+                z, y, x = shell.start
+                d, h, w = cropped.shape
+                full[z:z + d, y:y + h, x:x + w] = cropped.astype(bool)
+            print(f"  thickness {t}: erosion {erosion_ms:9.1f} ms   threshold {threshold_ms:7.2f} ms   "
+                  f"identical: {np.array_equal(full, reference)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: translating a WholeBody CT label volume (105 classes) to BTCV ids.
+
+"per organ" is the notebook's approach applied in memory (one full-volume
+comparison and masked write per BTCV organ); "lookup table" is
+label_spaces.remap_labels (lut[seg], one pass). The label volume is
+synthetic: blocks of random native ids.
+
+Run from the repository root:
+    python benchmarks/bench_label_remap.py [size]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from label_export import BTCV_ORGAN_FILES  # noqa: E402
+from label_spaces import build_lut, remap_labels, wholebody_ct_names  # noqa: E402
+
+BUNDLE_DIR = os.path.join(ROOT, "Segmentation codes", "WholeBodyCt", "monai_bundles", "wholeBody_ct_segmentation")
+
+
+def per_organ(seg, native_names):
+    btcv_ids = {name: label for label, name in BTCV_ORGAN_FILES.items()}
+    out = np.zeros(seg.shape, dtype=np.uint8)
+    for native_id, name in native_names.items():
+        if name in btcv_ids:
+            out[seg == int(native_id)] = btcv_ids[name]
+    return out
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 384
+    names = wholebody_ct_names(BUNDLE_DIR)
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, len(names), size=(size // 16, size // 16, size // 16), dtype=np.int16)
+    seg = np.kron(blocks, np.ones((16, 16, 16), dtype=np.int16))
+    print(f"Label volume {seg.shape} {seg.dtype}, {len(names)} native classes")
+
+    start = time.perf_counter()
+    old = per_organ(seg, names)
+    old_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lut = build_lut(names)
+    new = remap_labels(seg, lut)
+    new_s = time.perf_counter() - start
+
+    print(f"per organ     {old_s * 1000:8.1f} ms")
+    print(f"lookup table  {new_s * 1000:8.1f} ms")
+    print(f"Identical: {np.array_equal(old, new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: splitting a 13-organ label volume into per-organ NIfTI files.
+
+The label volume is assembled from Assets/SwinUnter/*/*.nii.gz. "notebook"
+is save_segmentation's loop (a full-volume seg == id per organ, serial
+nib.save); "export" is label_export.export_organ_masks (one bounding-box
+pass, files gzipped on a thread pool). Both outputs are compared voxel by
+voxel.
+
+Run from the repository root:
+    python benchmarks/bench_mask_export.py [workers] [compresslevel]
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import nibabel as nib
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from label_export import BTCV_ORGAN_FILES, export_organ_masks, organ_paths  # noqa: E402
+
+
+def build_label_volume():
+    file_labels = {name: label for label, name in BTCV_ORGAN_FILES.items()}
+    seg = affine = None
+    for path in sorted(glob.glob(os.path.join(ROOT, "Assets", "SwinUnter", "*", "*.nii.gz"))):
+        image = nib.load(path)
+        if seg is None:
+            seg = np.zeros(image.shape, dtype=np.uint8)
+            affine = image.affine
+        seg[np.asanyarray(image.dataobj) > 0] = file_labels[os.path.basename(path)[:-len(".nii.gz")]]
+    return seg, affine
+
+
+def notebook_export(seg, affine, output_dir):
+    """The notebook's save_segmentation organ loop."""
+    for organ_id, organ_name in BTCV_ORGAN_FILES.items():
+        organ_mask = (seg == organ_id).astype(np.uint8)
+        if organ_mask.any():
+            nib.save(nib.Nifti1Image(organ_mask, affine), os.path.join(output_dir, f"{organ_name}.nii.gz"))
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    compresslevel = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    seg, affine = build_label_volume()
+    print(f"Label volume {seg.shape}, {len(np.unique(seg)) - 1} organs")
+
+    with tempfile.TemporaryDirectory() as old_dir, tempfile.TemporaryDirectory() as new_dir:
+        start = time.perf_counter()
+        notebook_export(seg, affine, old_dir)
+        old_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        export_organ_masks(seg, affine, organ_paths(new_dir), compresslevel, workers)
+        new_s = time.perf_counter() - start
+
+        identical = True
+        for name in sorted(os.listdir(old_dir)):
+            a, b = nib.load(os.path.join(old_dir, name)), nib.load(os.path.join(new_dir, name))
+            identical &= np.array_equal(np.asanyarray(a.dataobj), np.asanyarray(b.dataobj))
+            identical &= np.allclose(a.affine, b.affine)
+        size = lambda d: sum(os.path.getsize(os.path.join(d, n)) for n in os.listdir(d)) / 1024**2
+        print(f"notebook loop  {old_s:6.2f} s   {size(old_dir):6.1f} MB")
+        print(f"export         {new_s:6.2f} s   {size(new_dir):6.1f} MB   "
+              f"(workers={workers or 'auto'}, level={compresslevel})")
+        print(f"Identical masks: {identical} ({len(os.listdir(old_dir))} files)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: sliding-window inference latency against the number of worker processes.
+
+Runs Swin UNETR (the BTCV architecture of segment_ct.py; random weights
+unless a checkpoint is given) on a synthetic CT-sized input:
+
+    single    monai sliding_window_inference with all CPU threads
+    workers   window_inference.parallel_sliding_window_inference with
+              1, 2, 4, ... processes sharing the same thread budget
+
+Reports latency, speed-up over "single" and the largest logit difference
+from it (float summation order only).
+
+Run from the repository root:
+    python benchmarks/bench_parallel_inference.py [max workers] [I,J,K] [model.pt]
+"""
+
+import os
+import sys
+import time
+
+import torch
+from monai.inferers import sliding_window_inference
+from monai.networks.nets import SwinUNETR
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Segmentation codes", "swinUnter"))
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from segment_ct import load_model  # noqa: E402
+from window_inference import parallel_sliding_window_inference  # noqa: E402
+
+ROI_SIZE = (96, 96, 96)
+SW_BATCH_SIZE = 4
+OVERLAP = 0.5
+
+
+def build_model(checkpoint=None):
+    if checkpoint:
+        return load_model(checkpoint, torch.device("cpu"))
+    model = SwinUNETR(in_channels=1, out_channels=14, feature_size=48, depths=(2, 2, 2, 2),
+                      num_heads=(3, 6, 12, 24), use_checkpoint=False, spatial_dims=3)
+    return model.eval()
+
+
+def main():
+    threads = os.cpu_count() or 1
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else threads
+    shape = tuple(int(v) for v in sys.argv[2].split(",")) if len(sys.argv) > 2 else (240, 240, 160)
+    model = build_model(sys.argv[3] if len(sys.argv) > 3 else None)
+    image = torch.rand((1, 1) + shape, generator=torch.Generator().manual_seed(0))
+    print(f"Input {shape}, roi {ROI_SIZE}, overlap {OVERLAP}, {threads} CPU threads")
+
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+    with torch.no_grad():
+        reference = sliding_window_inference(image, ROI_SIZE, SW_BATCH_SIZE, model, overlap=OVERLAP)
+    single_s = time.perf_counter() - start
+    print(f"single       {single_s:7.2f} s")
+
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        logits = parallel_sliding_window_inference(image, ROI_SIZE, SW_BATCH_SIZE, model, overlap=OVERLAP,
+                                                   workers=workers, threads=threads)
+        elapsed = time.perf_counter() - start
+        difference = (logits - torch.as_tensor(reference)).abs().max().item()
+        print(f"workers {workers:3d}  {elapsed:7.2f} s   x{single_s / elapsed:5.2f}   max |diff| {difference:.2e}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: dragging a PartControl opacity slider.
+
+Replays a slider drag (one valueChanged every 8 ms, a typical mouse-move
+rate) on translucent Liver parts in an offscreen render window, through a
+Qt event loop:
+
+    direct     Render() on every tick (the old set_part_opacity)
+    coalesced  RenderScheduler.request() on every tick
+
+Reports how many frames were rendered, the mean frame time, how long the
+drag took end to end (ideal: ticks x 8 ms) and how long after the last tick
+the final opacity was on screen.
+
+Run from the repository root:
+    python benchmarks/bench_render_coalescing.py [ticks]
+"""
+
+import glob
+import os
+import sys
+import time
+
+if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import SimpleITK as sitk
+import vtk
+from PyQt6.QtWidgets import QApplication
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from render_scheduler import RenderScheduler  # noqa: E402
+from surface_extraction import DEFAULT_ENGINE, extract_surface  # noqa: E402
+from viewer_3d import numpy_to_vtk_image  # noqa: E402
+
+TICK_MS = 8
+
+
+def build_scene():
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(800, 800)
+    renderer = vtk.vtkRenderer()
+    render_window.AddRenderer(renderer)
+
+    actors = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "Assets", "SwinUnter", "Liver", "*.nii.gz"))):
+        image = sitk.DICOMOrient(sitk.ReadImage(path), "LPS")
+        img_data = numpy_to_vtk_image(sitk.GetArrayFromImage(image), image.GetSpacing())
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(extract_surface(img_data, [1], DEFAULT_ENGINE))
+        mapper.ScalarVisibilityOff()
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        actor.GetProperty().SetOpacity(0.7)
+        renderer.AddActor(actor)
+        actors.append(actor)
+    renderer.ResetCamera()
+    render_window.Render()
+    return render_window, actors
+
+
+def drag(app, render_window, actor, ticks, coalesce):
+    scheduler = RenderScheduler(render_window)
+    frames = []
+    render_window.AddObserver("EndEvent", lambda *args: frames.append(time.perf_counter()))
+    values = [70 - (i % 70) for i in range(ticks)]
+
+    def on_value_changed(value):
+        actor.GetProperty().SetOpacity(value / 100.0)
+        if coalesce:
+            scheduler.request()
+        else:
+            render_window.Render()
+
+    # Like queued mouse moves: every tick that is due by wall time is
+    # delivered before the event loop gets to run again
+    start = time.perf_counter()
+    delivered = 0
+    while delivered < ticks:
+        due = min(ticks, int((time.perf_counter() - start) * 1000.0 / TICK_MS) + 1)
+        while delivered < due:
+            on_value_changed(values[delivered])
+            delivered += 1
+        app.processEvents()
+        time.sleep(0.001)
+    last_tick = time.perf_counter()
+    while scheduler.is_pending():
+        app.processEvents()
+        time.sleep(0.001)
+    end = time.perf_counter()
+    return {
+        "frames": len(frames),
+        "render_ms": scheduler.mean_render_ms(),
+        "drag_ms": (last_tick - start) * 1000.0,
+        "settle_ms": (end - last_tick) * 1000.0,
+    }
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    app = QApplication(sys.argv)
+    render_window, actors = build_scene()
+    print(f"{len(actors)} translucent parts, {ticks} slider ticks every {TICK_MS} ms "
+          f"(ideal drag {ticks * TICK_MS} ms)")
+    for label, coalesce in (("direct", False), ("coalesced", True)):
+        r = drag(app, render_window, actors[0], ticks, coalesce)
+        print(f"{label:<10} frames {r['frames']:4d}   frame {r['render_ms']:6.1f} ms   "
+              f"drag {r['drag_ms']:7.1f} ms   final frame after {r['settle_ms']:5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
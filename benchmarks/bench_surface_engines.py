@@ -0,0 +1,83 @@
+"""
+Benchmark the surface engines in gui/surface_extraction.py on the Assets masks.
+
+For every mask the volume is prepared exactly like VTK3DViewer.add_part_from_nifti
+(LPS orientation + adaptive_downsample), then each engine is timed. Visual
+deviation is the distance from every vertex of a candidate mesh to the
+reference marching-cubes surface (mean and max, in mm).
+
+Run from the repository root:
+    python benchmarks/bench_surface_engines.py [Assets/SwinUnter/Liver ...]
+"""
+
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import SimpleITK as sitk
+import vtk
+from vtk.util import numpy_support
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+from resampling import adaptive_downsample  # noqa: E402
+from surface_extraction import SURFACE_ENGINES, extract_surface, resolve_engine  # noqa: E402
+
+
+def load_mask(path):
+    img = sitk.DICOMOrient(sitk.ReadImage(path), 'LPS')
+    np_data, spacing, origin, _ = adaptive_downsample(sitk.GetArrayFromImage(img), img.GetSpacing(), verbose=False)
+    np_data = np.ascontiguousarray((np_data > 0).astype(np.uint8))
+
+    img_data = vtk.vtkImageData()
+    depth, height, width = np_data.shape
+    img_data.SetDimensions(width, height, depth)
+    img_data.SetSpacing(spacing)
+    img_data.SetOrigin(origin)
+    img_data.GetPointData().SetScalars(numpy_support.numpy_to_vtk(np_data.ravel(), deep=True))
+    return img_data
+
+
+def deviation(candidate, reference):
+    """Mean / max unsigned distance (mm) from candidate vertices to the reference surface."""
+    distance = vtk.vtkImplicitPolyDataDistance()
+    distance.SetInput(reference)
+    points = numpy_support.vtk_to_numpy(candidate.GetPoints().GetData())
+    if len(points) > 20000:
+        points = points[np.linspace(0, len(points) - 1, 20000).astype(int)]
+    d = np.abs([distance.EvaluateFunction(p) for p in points])
+    return float(d.mean()), float(d.max())
+
+
+def main():
+    targets = sys.argv[1:] or [os.path.join(ROOT, "Assets", "SwinUnter", organ) for organ in ("Liver", "Kidneys", "Stomach")]
+    files = sorted(f for t in targets for f in (glob.glob(os.path.join(t, "*.nii.gz")) if os.path.isdir(t) else [t]))
+    engines = [e for e in SURFACE_ENGINES if resolve_engine(e) == e]
+    print(f"VTK {vtk.vtkVersion.GetVTKVersion()}, engines: {', '.join(engines)}")
+
+    totals = {e: [0.0, 0] for e in engines}
+    print(f"{'mask':<52} {'engine':<15} {'time ms':>9} {'triangles':>10} {'mean dev':>9} {'max dev':>9}")
+    for path in files:
+        img_data = load_mask(path)
+        reference = None
+        for engine in engines:
+            start = time.perf_counter()
+            surface = extract_surface(img_data, [1], engine)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            if reference is None:
+                reference = surface
+            mean_dev, max_dev = deviation(surface, reference) if surface.GetNumberOfPoints() else (0.0, 0.0)
+            totals[engine][0] += elapsed
+            totals[engine][1] += surface.GetNumberOfPolys()
+            name = os.path.relpath(path, os.path.join(ROOT, "Assets"))
+            print(f"{name:<52} {engine:<15} {elapsed:9.1f} {surface.GetNumberOfPolys():10d} {mean_dev:9.3f} {max_dev:9.3f}")
+
+    print("\nTotals")
+    for engine, (elapsed, triangles) in totals.items():
+        print(f"  {engine:<15} {elapsed:9.1f} ms {triangles:10d} triangles")
+
+
+if __name__ == "__main__":
+    main()
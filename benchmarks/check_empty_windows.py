@@ -0,0 +1,139 @@
+"""
+Check: skipping empty sliding windows (skip_empty) on a toy predictor.
+
+Unlike bench_empty_windows.py this needs neither a CT nor a checkpoint. A
+phantom of the ScaleIntensityRange output (air exactly 0, soft tissue 0.1,
+organ label c at 0.2 + 0.05 c) is built from the Assets/SwinUnter label
+maps at half resolution (3 mm): the organs, wrapped in a body of soft
+tissue BODY_MARGIN voxels thick, in the original field of view plus
+`air` voxels of extra air on every side (default 40; the Assets field of
+view itself has no empty window at roi 96, overlap 0.5). The toy predictor
+labels a voxel by its nearest intensity level. Without context it looks at
+the voxel only, so every window predicts the same there; with context it
+uses the 3x3x3 mean inside the window plus a term that depends on the whole
+window (as a network's receptive field does), so overlapping windows
+disagree and the blending matters.
+
+Each predictor is run over every window and with skip_empty, and the
+script reports:
+
+    windows     forward passes run, and saved, by skip_empty
+    logits      largest difference on voxels a run window still covers,
+                with the context-free predictor (the normalisation map
+                without the skipped windows must give the same average)
+    body        body voxels (above EMPTY_WINDOW level) whose label changes
+
+Exits with status 1 if the logits differ by more than LOGIT_TOLERANCE or
+any body voxel changes label.
+
+Run from the repository root:
+    python benchmarks/check_empty_windows.py [air]
+
+Both runs' logits are held at once (14 classes, float32): air 40 needs
+about 3 GB.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from scipy import ndimage
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Segmentation codes", "swinUnter"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from bench_mask_export import build_label_volume  # noqa: E402
+from segment_ct import EMPTY_WINDOW, INFERENCE_SETTINGS  # noqa: E402
+from window_inference import is_empty_window, parallel_sliding_window_inference, plan_for  # noqa: E402
+
+BODY_MARGIN = 8
+CLASSES = 14
+LOGIT_TOLERANCE = 1e-4
+
+
+class ToyPredictor(torch.nn.Module):
+    """Nearest-intensity classifier; with context, window-dependent like a network."""
+
+    def __init__(self, context=0.0):
+        super().__init__()
+        self.context = context
+        self.forward_passes = 0
+        levels = [0.2 + 0.05 * c for c in range(CLASSES)]
+        levels[0] = 0.1  # soft tissue is background too
+        self.register_buffer("levels", torch.tensor(levels).view(1, -1, 1, 1, 1))
+
+    def forward(self, x):
+        self.forward_passes += x.shape[0]
+        mean = F.avg_pool3d(x, 3, stride=1, padding=1, count_include_pad=False) if self.context else x
+        logits = -20.0 * (mean - self.levels).abs()
+        logits[:, :1] = torch.maximum(logits[:, :1], -20.0 * mean)  # air
+        if self.context:
+            window_mean = x.mean(dim=(2, 3, 4), keepdim=True)
+            logits = logits + self.context * window_mean * torch.linspace(-1.0, 1.0, CLASSES).view(1, -1, 1, 1, 1)
+        return logits
+
+
+def build_phantom(air=0):
+    labels = build_label_volume()[0][::2, ::2, ::2]
+    body = ndimage.binary_fill_holes(ndimage.binary_dilation(labels > 0, iterations=BODY_MARGIN))
+    image = np.where(body, 0.1, 0.0).astype(np.float32)
+    image[labels > 0] = 0.2 + 0.05 * labels[labels > 0]
+    noise = np.random.default_rng(0).normal(0.0, 0.01, image.shape).astype(np.float32)
+    image[body] = np.clip(image[body] + noise[body], 0.01, 1.0)
+    return np.pad(image, air)
+
+
+def covered_by_run_windows(image):
+    """Windows found empty, and the voxels that at least one non-empty window covers."""
+    plan = plan_for(image.shape[2:], INFERENCE_SETTINGS["roi_size"], INFERENCE_SETTINGS["overlap"])
+    covered = torch.zeros(image.shape[2:], dtype=torch.bool)
+    empty = 0
+    for w in plan.windows:
+        if is_empty_window(image[(slice(None), slice(None)) + w], EMPTY_WINDOW["level"], EMPTY_WINDOW["fraction"]):
+            empty += 1
+        else:
+            covered[w] = True
+    return empty, len(plan.windows), covered
+
+
+def run(image, predictor, skip):
+    predictor.forward_passes = 0
+    start = time.perf_counter()
+    logits = parallel_sliding_window_inference(
+        image, tuple(INFERENCE_SETTINGS["roi_size"]), INFERENCE_SETTINGS["sw_batch_size"], predictor,
+        overlap=INFERENCE_SETTINGS["overlap"], workers=1,
+        empty_level=EMPTY_WINDOW["level"] if skip else None, empty_fraction=EMPTY_WINDOW["fraction"])
+    return logits[0], predictor.forward_passes, time.perf_counter() - start
+
+
+def main():
+    air = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    image = torch.from_numpy(build_phantom(air))[None, None]
+    body = image[0, 0] > EMPTY_WINDOW["level"]
+    empty, windows, covered = covered_by_run_windows(image)
+    print(f"Phantom {tuple(image.shape[2:])} (3 mm), {int(body.sum())} body voxels, "
+          f"{empty} of {windows} windows empty")
+
+    failed = False
+    for context in (0.0, 2.0):
+        predictor = ToyPredictor(context).eval()
+        full, full_passes, full_s = run(image, predictor, skip=False)
+        skipped, skip_passes, skip_s = run(image, predictor, skip=True)
+        logit_diff = (full - skipped)[:, covered].abs().max().item()
+        changed = int((full.argmax(0) != skipped.argmax(0))[body].sum())
+        print(f"\ncontext {context}")
+        print(f"  forward passes  {full_passes} -> {skip_passes} ({full_passes - skip_passes} saved, "
+              f"{100.0 * (full_passes - skip_passes) / full_passes:.1f}%)")
+        print(f"  time            {full_s:.2f} s -> {skip_s:.2f} s")
+        print(f"  logits          max |diff| {logit_diff:.2e} on covered voxels")
+        print(f"  body            {changed} voxels change label")
+        failed |= changed > 0 or (context == 0.0 and logit_diff > LOGIT_TOLERANCE)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Check: resampling.block_label_pool on integer, float32 and bool label maps.
+
+The viewer pools every label map it loads with adaptive_downsample(...,
+multilabel=True), and the WholeBodyCt masks in Assets are float32. This
+script checks that
+
+    vote        on a random multi-label volume, every block gets its most
+                frequent non-zero label (lowest id on ties), as a brute-force
+                per-block count gives
+    float32     a float32 copy of the Assets 13-label volume pools to the same
+                labels as its uint8 original, and stays float32
+    mask        a float32 WholeBodyCt mask, read as the viewer reads it,
+                goes through adaptive_downsample(multilabel=True) and equals
+                block max pooling (one label, so the vote is the maximum)
+    bool        a bool mask pools like its uint8 copy and stays bool
+
+Exits with status 1 if any check fails.
+
+Run from the repository root:
+    python benchmarks/check_label_pool.py
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+import SimpleITK as sitk
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "gui"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from bench_mask_export import build_label_volume  # noqa: E402
+from resampling import adaptive_downsample, block_label_pool, block_max_pool  # noqa: E402
+
+FACTORS = (2, 3, 2)
+
+
+def brute_force_vote(np_data, factors):
+    pad = [(0, -n % f) for n, f in zip(np_data.shape, factors)]
+    padded = np.pad(np_data, pad)
+    out = np.zeros([n // f for n, f in zip(padded.shape, factors)], dtype=np_data.dtype)
+    for index in np.ndindex(out.shape):
+        block = padded[tuple(slice(i * f, (i + 1) * f) for i, f in zip(index, factors))]
+        labels, counts = np.unique(block[block > 0], return_counts=True)
+        out[index] = labels[np.argmax(counts)] if labels.size else 0
+    return out
+
+
+def report(name, ok, detail):
+    print(f"{name:<10}{'ok' if ok else 'FAILED':<8}{detail}")
+    return ok
+
+
+def main():
+    results = []
+
+    rng = np.random.default_rng(0)
+    small = rng.choice(4, size=(9, 10, 11), p=[0.4, 0.3, 0.2, 0.1]).astype(np.uint8)
+    pooled = block_label_pool(small, FACTORS)
+    results.append(report("vote", np.array_equal(pooled, brute_force_vote(small, FACTORS)),
+                          f"{small.shape} -> {pooled.shape} against a per-block count"))
+
+    labels = build_label_volume()[0]
+    as_uint8 = block_label_pool(labels, FACTORS)
+    as_float = block_label_pool(labels.astype(np.float32), FACTORS)
+    results.append(report("float32", as_float.dtype == np.float32 and np.array_equal(as_float, as_uint8),
+                          f"{labels.shape} 13 labels, {as_float.dtype} result"))
+
+    path = sorted(glob.glob(os.path.join(ROOT, "Assets", "WholeBodyCt", "*", "*.nii.gz")))[0]
+    image = sitk.DICOMOrient(sitk.ReadImage(path), "LPS")
+    mask = sitk.GetArrayFromImage(image)
+    data, _, _, _ = adaptive_downsample(mask, image.GetSpacing(), verbose=False, multilabel=True)
+    expected, _, _, _ = adaptive_downsample(mask, image.GetSpacing(), verbose=False)
+    results.append(report("mask", data.dtype == mask.dtype and np.array_equal(data, expected),
+                          f"{os.path.basename(path)} ({mask.dtype}) -> {data.shape}"))
+
+    binary = small > 1
+    pooled = block_label_pool(binary, FACTORS)
+    results.append(report("bool", pooled.dtype == bool and np.array_equal(pooled, block_max_pool(binary, FACTORS)),
+                          f"{binary.shape} -> {pooled.shape}"))
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Check: window_inference.py against MONAI's sliding_window_inference.
+
+run_inference uses MONAI by default and window_inference.py only for
+workers > 1 or skip_empty, so the two must give the same logits. A small
+random Conv3d stands in for the network (the blending does not depend on
+it); volumes smaller than the window on some axes exercise the padding.
+Every shape is run with constant and gaussian blending, with the plan
+built and then reused from the cache, in this process and split over two
+workers.
+
+Exits with status 1 if any max |difference| exceeds TOLERANCE.
+
+Run from the repository root:
+    python benchmarks/check_window_inference.py
+"""
+
+import os
+import sys
+
+import torch
+from monai.inferers import sliding_window_inference
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Segmentation codes", "swinUnter"))
+from window_inference import parallel_sliding_window_inference  # noqa: E402
+
+ROI_SIZE = (32, 32, 32)
+SW_BATCH_SIZE = 3
+SHAPES = ((70, 50, 90), (40, 100, 20))
+OVERLAPS = (0.5, 0.25)
+TOLERANCE = 1e-5
+
+
+def main():
+    torch.manual_seed(0)
+    model = torch.nn.Conv3d(1, 3, 3, padding=1).eval()
+    worst = 0.0
+    print(f"{'shape':<16}{'mode':<10}{'overlap':>8}{'workers':>9}{'max |diff|':>13}")
+    for shape in SHAPES:
+        image = torch.rand((1, 1) + shape)
+        for mode in ("constant", "gaussian"):
+            for overlap in OVERLAPS:
+                with torch.no_grad():
+                    reference = torch.as_tensor(sliding_window_inference(image, ROI_SIZE, SW_BATCH_SIZE, model,
+                                                                         overlap=overlap, mode=mode))
+                # Twice in this process (plan built, then cached), then over two workers
+                for workers in (1, 1, 2):
+                    logits = parallel_sliding_window_inference(image, ROI_SIZE, SW_BATCH_SIZE, model,
+                                                               overlap=overlap, mode=mode, workers=workers,
+                                                               threads=workers)
+                    difference = (logits - reference).abs().max().item()
+                    worst = max(worst, difference)
+                    print(f"{str(shape):<16}{mode:<10}{overlap:>8}{workers:>9}{difference:>13.2e}")
+
+    print(f"\nLargest difference {worst:.2e} (tolerance {TOLERANCE})")
+    sys.exit(0 if worst <= TOLERANCE else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Persistent DICOM series index.
+
+GetGDCMSeriesFileNames() (and dicom_loader.scan_folder()) parse every file
+in a folder on every load. SeriesIndex keeps one small JSON file per folder
+with each file's size, mtime and parsed header (series UID, slice position,
+geometry). A load only stats the directory and parses files that are new or
+changed; removed files are dropped. Sorting a series then works from the
+cached positions without touching the files.
+
+Non-DICOM files are remembered too, so they are not re-probed either.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from dicom_loader import order_series, read_headers
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "medical_viewer", "dicom_index")
+
+# Bump when the stored header fields change; older index files are rebuilt
+INDEX_VERSION = 1
+
+# Header fields stored per file (tuples become JSON lists)
+_HEADER_KEYS = ("series_uid", "position", "direction", "spacing", "size")
+
+
+class SeriesIndex:
+    """Per-folder cache of DICOM headers, refreshed incrementally by file size and mtime."""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.last_refresh = {}  # folder -> {"parsed", "reused", "removed", "elapsed_ms"}
+
+    def _index_path(self, folder_path):
+        digest = hashlib.sha1(folder_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.index_dir, f"{digest}.json")
+
+    def _load(self, folder_path):
+        try:
+            with open(self._index_path(folder_path), "r") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("folder") == folder_path:
+                return data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self, folder_path, files):
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            path = self._index_path(folder_path)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": INDEX_VERSION, "folder": folder_path, "files": files}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write DICOM index for {folder_path}: {e}")
+
+    def refresh(self, folder_path, workers=None):
+        """
+        Bring a folder's index up to date and return its file entries.
+
+        Returns:
+            dict: file name -> {"size", "mtime_ns", "header"} (header is None
+            for non-DICOM files).
+        """
+        start_time = time.perf_counter()
+        folder_path = os.path.abspath(folder_path)
+        cached = self._load(folder_path)
+
+        files = {}
+        stale = []
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entry_data = cached.get(entry.name)
+                if entry_data and entry_data["size"] == stat.st_size and entry_data["mtime_ns"] == stat.st_mtime_ns:
+                    files[entry.name] = entry_data
+                else:
+                    files[entry.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "header": None}
+                    stale.append(entry.name)
+
+        headers = read_headers([os.path.join(folder_path, name) for name in stale], workers)
+        for name, header in zip(stale, headers):
+            if header is not None:
+                files[name]["header"] = {key: header[key] for key in _HEADER_KEYS}
+
+        removed = len(set(cached) - set(files))
+        if stale or removed or not cached:
+            self._save(folder_path, files)
+
+        self.last_refresh[folder_path] = {
+            "parsed": len(stale),
+            "reused": len(files) - len(stale),
+            "removed": removed,
+            "elapsed_ms": (time.perf_counter() - start_time) * 1000.0,
+        }
+        return files
+
+    def headers(self, folder_path, workers=None):
+        """Headers of every DICOM file in a folder, in dicom_loader.read_header() form."""
+        folder_path = os.path.abspath(folder_path)
+        headers = []
+        for name, entry_data in sorted(self.refresh(folder_path, workers).items()):
+            header = entry_data["header"]
+            if header is None:
+                continue
+            header = {key: tuple(value) if isinstance(value, list) else value for key, value in header.items()}
+            header["path"] = os.path.join(folder_path, name)
+            headers.append(header)
+        return headers
+
+    def series(self, folder_path):
+        """Series UID -> slice count for a folder."""
+        counts = {}
+        for header in self.headers(folder_path):
+            counts[header["series_uid"]] = counts.get(header["series_uid"], 0) + 1
+        return counts
+
+    def ordered_files(self, folder_path, series_uid=None):
+        """Sorted file list of one series (a drop-in for GetGDCMSeriesFileNames)."""
+        return [h["path"] for h in order_series(self.headers(folder_path), series_uid)]
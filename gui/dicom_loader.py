@@ -0,0 +1,192 @@
+"""
+Progressive DICOM series loading.
+
+Replaces the blocking ImageSeriesReader.Execute() call: slice headers are
+read first (no pixel data) to pick and sort the series, then the slices are
+decoded on a thread pool straight into one preallocated Z,Y,X array. The
+caller gets progress callbacks and, optionally, a coarse preview volume built
+from every Nth slice before the full series has finished decoding.
+
+Callbacks always run in the calling thread, so Qt widgets can be updated
+from them (followed by QApplication.processEvents()).
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import SimpleITK as sitk
+
+# Default preview density: every Nth slice of the sorted series
+DEFAULT_PREVIEW_STEP = 4
+
+
+def _default_workers():
+    return min(8, os.cpu_count() or 1)
+
+
+def read_header(path):
+    """
+    Read one file's DICOM header without decoding pixels.
+
+    Returns:
+        dict: path, series_uid, position, direction, spacing, size; or None
+        if the file is not a readable DICOM image.
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO("GDCMImageIO")
+    reader.SetFileName(path)
+    try:
+        reader.ReadImageInformation()
+    except RuntimeError:
+        return None
+    series_uid = reader.GetMetaData("0020|000e").strip() if reader.HasMetaDataKey("0020|000e") else ""
+    return {
+        "path": path,
+        "series_uid": series_uid,
+        "position": reader.GetOrigin(),
+        "direction": reader.GetDirection(),
+        "spacing": reader.GetSpacing(),
+        "size": reader.GetSize(),
+    }
+
+
+def read_headers(paths, workers=None):
+    """read_header() for many files on a thread pool (None for non-DICOM files)."""
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or _default_workers()) as pool:
+        return list(pool.map(read_header, paths))
+
+
+def scan_folder(folder_path, workers=None):
+    """Read the headers of every file in a folder (non-DICOM files are skipped)."""
+    paths = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path)
+                   if os.path.isfile(os.path.join(folder_path, name)))
+    return [h for h in read_headers(paths, workers) if h is not None]
+
+
+def slice_normal(direction):
+    """Third column of a 3x3 row-major direction matrix (the slice normal)."""
+    return np.array(direction[2::3], dtype=float)
+
+
+def order_series(headers, series_uid=None):
+    """
+    Pick one series and sort its slices along the slice normal.
+
+    Args:
+        headers (list): read_header() results, possibly from several series.
+        series_uid (str): Series to load (default: the one with most slices).
+
+    Returns:
+        list: Headers of the chosen series, in slice order.
+    """
+    series = {}
+    for header in headers:
+        series.setdefault(header["series_uid"], []).append(header)
+    if not series:
+        return []
+    if series_uid is None:
+        series_uid = max(series, key=lambda uid: len(series[uid]))
+        if len(series) > 1:
+            print(f"Folder holds {len(series)} series, loading {series_uid} ({len(series[series_uid])} slices)")
+    chosen = series.get(series_uid, [])
+    if not chosen:
+        return []
+    normal = slice_normal(chosen[0]["direction"])
+    return sorted(chosen, key=lambda h: float(np.dot(h["position"], normal)))
+
+
+def _z_spacing(headers):
+    if len(headers) < 2:
+        return headers[0]["spacing"][2]
+    normal = slice_normal(headers[0]["direction"])
+    steps = np.diff([np.dot(h["position"], normal) for h in headers])
+    return float(np.median(steps)) or headers[0]["spacing"][2]
+
+
+def _to_image(array, first, z_spacing):
+    """Wrap a Z,Y,X array as a SimpleITK image with the series geometry."""
+    image = sitk.GetImageFromArray(array)
+    image.SetOrigin(first["position"])
+    image.SetSpacing((first["spacing"][0], first["spacing"][1], z_spacing))
+    image.SetDirection(first["direction"])
+    return image
+
+
+def _decode_slice(path):
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO("GDCMImageIO")
+    reader.SetFileName(path)
+    return sitk.GetArrayFromImage(reader.Execute())[0]
+
+
+def load_series(headers, progress=None, preview=None, preview_step=DEFAULT_PREVIEW_STEP, workers=None):
+    """
+    Decode sorted slices in parallel into one volume.
+
+    Args:
+        headers (list): Sorted headers from order_series().
+        progress (callable): progress(done, total), called after every slice.
+        preview (callable): preview(image) with every preview_step-th slice,
+            called once those slices are decoded (skipped for short series).
+        preview_step (int): Slice step of the preview volume.
+        workers (int): Decoder threads.
+
+    Returns:
+        sitk.Image: The full series (same geometry as ImageSeriesReader).
+    """
+    if not headers:
+        raise ValueError("No DICOM slices to load")
+    start_time = time.perf_counter()
+    total = len(headers)
+    z_spacing = _z_spacing(headers)
+
+    # Decode the first slice up front to size the output array
+    first_slice = _decode_slice(headers[0]["path"])
+    volume = np.empty((total,) + first_slice.shape, dtype=first_slice.dtype)
+    volume[0] = first_slice
+    done = 1
+    if progress:
+        progress(done, total)
+
+    use_preview = preview is not None and preview_step > 1 and total >= 2 * preview_step
+    preview_indices = list(range(0, total, preview_step)) if use_preview else []
+    preview_set = set(preview_indices)
+    # Preview slices are queued first so the coarse volume is ready early
+    order = [i for i in preview_indices if i != 0] + [i for i in range(1, total) if i not in preview_set]
+
+    with ThreadPoolExecutor(max_workers=workers or _default_workers()) as pool:
+        futures = {pool.submit(_decode_slice, headers[i]["path"]): i for i in order}
+        preview_pending = len(preview_indices) - 1 if use_preview else 0
+
+        for future in as_completed(futures):
+            index = futures[future]
+            volume[index] = future.result()
+            done += 1
+            if progress:
+                progress(done, total)
+
+            if index in preview_set:
+                preview_pending -= 1
+                if preview_pending == 0:
+                    preview(_to_image(volume[::preview_step].copy(), headers[0], z_spacing * preview_step))
+
+    print(f"Decoded {total} DICOM slices in {(time.perf_counter() - start_time) * 1000.0:.1f} ms")
+    return _to_image(volume, headers[0], z_spacing)
+
+
+def load_dicom_folder(folder_path, progress=None, preview=None, preview_step=DEFAULT_PREVIEW_STEP,
+                      series_uid=None, workers=None, index=None):
+    """Scan, sort and progressively decode the DICOM series in a folder.
+
+    With a dicom_index.SeriesIndex, headers come from the persistent index
+    and only new or changed files are parsed.
+    """
+    headers = index.headers(folder_path, workers) if index is not None else scan_folder(folder_path, workers)
+    headers = order_series(headers, series_uid)
+    if not headers:
+        raise ValueError(f"No DICOM series found in {folder_path}")
+    return load_series(headers, progress, preview, preview_step, workers)
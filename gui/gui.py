@@ -7,15 +7,42 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
 from PyQt6.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer
 from PyQt6.QtGui import QColor, QFont, QPalette, QIcon, QPixmap, QLinearGradient, QBrush, QPainter, QPainterPath
 import os
-import pandas as pd
-
-# Import 3D Viewer (optional - will work without VTK installed)
-try:
-    from viewer_3d import VTK3DViewer
-    VTK_AVAILABLE = True
-except ImportError:
-    VTK_AVAILABLE = False
-    print("VTK not available - 3D viewer will be disabled")
+import threading
+import time
+
+# The 3D stack (viewer_3d: VTK, SimpleITK, NumPy, SciPy) takes well over a
+# second to import and are only needed once an organ is opened. They
+# are imported lazily: warmed on a background thread right after the
+# selection screen is shown, or on first use if that has not finished yet.
+VTK_AVAILABLE = None  # None until load_viewer_class() has run
+_VTK3DViewer = None
+_import_lock = threading.Lock()
+
+
+def load_viewer_class():
+    """Return VTK3DViewer, importing the 3D stack on first call (None without VTK)."""
+    global VTK_AVAILABLE, _VTK3DViewer
+    with _import_lock:
+        if VTK_AVAILABLE is None:
+            # Import 3D Viewer (optional - will work without VTK installed)
+            try:
+                from viewer_3d import VTK3DViewer
+                _VTK3DViewer = VTK3DViewer
+                VTK_AVAILABLE = True
+            except ImportError:
+                VTK_AVAILABLE = False
+                print("VTK not available - 3D viewer will be disabled")
+    return _VTK3DViewer
+
+
+def warm_heavy_modules():
+    """Import the 3D stack on a daemon thread (no widgets are created there)."""
+    def worker():
+        start_time = time.perf_counter()
+        load_viewer_class()
+        print(f"Background warm-up finished in {(time.perf_counter() - start_time) * 1000.0:.0f} ms")
+
+    threading.Thread(target=worker, name="module-warmup", daemon=True).start()
 
 # --- PREMIUM GLASSMORPHISM COLOR PALETTE ---
 THEME = {
@@ -262,7 +289,7 @@ def add_glow(widget, blur=40, color=QColor(100, 181, 255, 60)):
 
 class PartControl(QFrame):
     """Specific controls for one of the 3 organ parts."""
-    def __init__(self, name, initial_color):
+    def __init__(self, name, initial_color, metrics=None):
         super().__init__()
         self.setObjectName("ControlCard")
         self.part_name = name
@@ -282,6 +309,13 @@ class PartControl(QFrame):
         header.addWidget(self.visible_chk)
         layout.addLayout(header)
 
+        # Per-structure metrics from the evaluation (if this file was scored)
+        if metrics is not None:
+            metrics_label = QLabel(
+                f"Dice {metrics['Dice']:.4f}  ·  IoU {metrics['IoU']:.4f}  ·  HD95 {metrics['Hausdorff95']:.2f} mm")
+            metrics_label.setStyleSheet(f"color: {THEME['text_secondary']}; font-size: 11px;")
+            layout.addWidget(metrics_label)
+
         # Opacity Slider with label
         opacity_row = QHBoxLayout()
         opacity_label = QLabel("Opacity")
@@ -302,29 +336,31 @@ class PartControl(QFrame):
         # Color Picker Button
         self.color_btn = QPushButton("● Surface Color")
         self.color_btn.setObjectName("ColorBtn")
+        self.set_button_color(initial_color)
+        self.color_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.color_btn.clicked.connect(self.pick_color)
+        layout.addWidget(self.color_btn)
+
+    def set_button_color(self, color_name):
         self.color_btn.setStyleSheet(f"""
             background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                stop:0 {initial_color}, stop:1 {initial_color}dd);
-            color: #000; 
+                stop:0 {color_name}, stop:1 {color_name}dd);
+            color: #000;
             font-weight: 600;
             border-radius: 8px;
             padding: 10px;
         """)
-        self.color_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.color_btn.clicked.connect(self.pick_color)
-        layout.addWidget(self.color_btn)
+
+    def set_state(self, visible, opacity, color_tuple):
+        """Show an existing actor's visibility, opacity (0-1) and color."""
+        self.visible_chk.setChecked(visible)
+        self.slider.setValue(int(round(opacity * 100)))
+        self.set_button_color(QColor.fromRgbF(*color_tuple).name())
 
     def pick_color(self):
         color = QColorDialog.getColor()
         if color.isValid():
-            self.color_btn.setStyleSheet(f"""
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 {color.name()}, stop:1 {color.name()}dd);
-                color: #000;
-                font-weight: 600;
-                border-radius: 8px;
-                padding: 10px;
-            """)
+            self.set_button_color(color.name())
             # Update 3D viewer color
             if self.viewer_3d:
                 color_tuple = (color.redF(), color.greenF(), color.blueF())
@@ -352,6 +388,27 @@ class MedicalWorkspace(QMainWindow):
         "WholeBody CT": ""
     }
     
+    # Optional single label map per model folder (written by segment_ct.py);
+    # when present all parts are surfaced in one pass instead of one file each
+    LABEL_MAP_FILE = "segmentation_output.nii.gz"
+    
+    # BTCV label ids for each part (see ORGAN_LABELS in segment_ct.py)
+    PART_LABEL_IDS = {
+        "Spleen": 1,
+        "Right Kidney": 2,
+        "Left Kidney": 3,
+        "Gallbladder": 4,
+        "Esophagus": 5,
+        "Liver": 6,
+        "Stomach": 7,
+        "Aorta": 8,
+        "Inferior Vena Cava": 9,
+        "Portal/Splenic Vein": 10,
+        "Pancreas": 11,
+        "Right Adrenal": 12,
+        "Left Adrenal": 13
+    }
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Medical Analysis Suite")
@@ -364,44 +421,45 @@ class MedicalWorkspace(QMainWindow):
         # Current state
         self.current_organ = None
         self.current_model = "Swin UNETR"
-        self.viewer_3d = None
+        self.viewer_3d = None  # one viewer (and render window) shared by every organ
+        self.workspace = None  # analysis page, built on first open_analysis()
         self.metrics_labels = {}
         self.part_controls = []  # Store part controls for connecting to viewer
         
-        # Load metrics from CSV files
-        self.metrics_data = self.load_all_metrics()
+        # MetricsStore, read on first use
+        self.metrics_data = None
 
         self.init_selection_screen()
     
     def load_all_metrics(self):
-        """Load metrics from all model CSV files."""
-        metrics = {}
+        """Load every model's metrics (metrics.sqlite, or the CSV files if it is missing)."""
+        from metrics_store import MetricsStore
+
         script_dir = os.path.dirname(os.path.abspath(__file__))
         metrics_dir = os.path.join(script_dir, "..", "Evaluation-Metrics")
-        
-        for model_name, csv_name in self.MODEL_CSV_NAMES.items():
-            csv_path = os.path.join(metrics_dir, f"{csv_name}_summary.csv")
-            if os.path.exists(csv_path):
-                try:
-                    df = pd.read_csv(csv_path)
-                    metrics[model_name] = {}
-                    for _, row in df.iterrows():
-                        organ = row['Organ']
-                        metrics[model_name][organ] = {
-                            'Dice': row['Dice'],
-                            'IoU': row['IoU'],
-                            'Hausdorff95': row['Hausdorff95']
-                        }
-                except Exception as e:
-                    print(f"Error loading metrics for {model_name}: {e}")
-        return metrics
+        return MetricsStore(metrics_dir)
     
     def get_metrics_for_current(self):
         """Get metrics for current model and organ."""
-        if self.current_model in self.metrics_data and self.current_organ in self.metrics_data[self.current_model]:
-            return self.metrics_data[self.current_model][self.current_organ]
+        if self.metrics_data is None:
+            self.metrics_data = self.load_all_metrics()
+        csv_name = self.MODEL_CSV_NAMES.get(self.current_model)
+        metrics = self.metrics_data.get_summary(csv_name, self.current_organ)
+        if metrics is not None:
+            return metrics
         return {'Dice': 0.0, 'IoU': 0.0, 'Hausdorff95': 0.0}
 
+    def get_part_metrics(self, file_name):
+        """Per-structure metrics for one part file of the current model and organ, or None."""
+        if self.metrics_data is None:
+            self.metrics_data = self.load_all_metrics()
+        # Ground-truth names in the metrics have no model prefix (ct_liver -> liver)
+        prefix = self.MODEL_FILE_PREFIX.get(self.current_model, "")
+        if prefix and file_name.startswith(prefix):
+            file_name = file_name[len(prefix):]
+        csv_name = self.MODEL_CSV_NAMES.get(self.current_model)
+        return self.metrics_data.get_file(csv_name, self.current_organ, file_name)
+
     def init_selection_screen(self):
         page = QWidget()
         layout = QVBoxLayout(page)
@@ -510,9 +568,35 @@ class MedicalWorkspace(QMainWindow):
         self.stack.addWidget(page)
 
     def open_analysis(self, organ_name):
+        """Show the analysis workspace for an organ.
+
+        The workspace page and its 3D viewer are built once and reused for
+        every organ; only the organ-specific panels are refreshed and the
+        viewer switches to that organ's session (see VTK3DViewer.switch_session).
+        """
         self.current_organ = organ_name
         self.current_model = "Swin UNETR"  # Default model
         
+        if self.workspace is None:
+            self.build_workspace()
+        
+        self.organ_header.setText(
+            f"<span style='font-size: 24px; font-weight: 700;'>{organ_name}</span><br/>"
+            f"<span style='font-size: 13px; color: {THEME['text_secondary']};'>Analysis Dashboard</span>")
+        self.model_combo.blockSignals(True)
+        self.model_combo.setCurrentText(self.current_model)
+        self.model_combo.blockSignals(False)
+        self.update_metrics_display()
+        self.refresh_layer_controls()
+        self.stack.setCurrentWidget(self.workspace)
+        
+        # Before the first viewer exists, init_vtk_viewer() loads the data
+        if self.viewer_3d is not None:
+            self.viewer_3d.set_organ_name(organ_name)
+            QTimer.singleShot(100, self.load_model_data)
+
+    def build_workspace(self):
+        """Create the (single, reused) analysis page."""
         workspace = QWidget()
         layout = QHBoxLayout(workspace)
         layout.setSpacing(20)
@@ -527,9 +611,8 @@ class MedicalWorkspace(QMainWindow):
         l_lay.setSpacing(16)
         
         # Header
-        header = QLabel(f"<span style='font-size: 24px; font-weight: 700;'>{organ_name}</span><br/>"
-                       f"<span style='font-size: 13px; color: {THEME['text_secondary']};'>Analysis Dashboard</span>")
-        l_lay.addWidget(header)
+        self.organ_header = QLabel()
+        l_lay.addWidget(self.organ_header)
         
         # Divider
         divider = QFrame()
@@ -546,6 +629,7 @@ class MedicalWorkspace(QMainWindow):
         models.addItems(["Swin UNETR", "Total Segmentator", "WholeBody CT"])
         models.setCurrentText(self.current_model)
         l_lay.addWidget(models)
+        self.model_combo = models
 
         l_lay.addSpacing(10)
         
@@ -609,67 +693,56 @@ class MedicalWorkspace(QMainWindow):
         view_header = QLabel(f"<span style='font-size: 16px; font-weight: 600;'>3D Surface Extraction</span>")
         c_lay.addWidget(view_header, alignment=Qt.AlignmentFlag.AlignCenter)
         
-        # VTK 3D Viewer or placeholder
-        if VTK_AVAILABLE:
-            # Create a container for the viewer
-            viewer_container = QWidget()
-            viewer_layout = QVBoxLayout(viewer_container)
-            viewer_layout.setContentsMargins(0, 0, 0, 0)
-            c_lay.addWidget(viewer_container)
-            
-            # Temporary loading label
-            loading_label = QLabel("Initializing 3D Analysis...\nPlease wait...")
-            loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            loading_label.setStyleSheet(f"color: {THEME['text_secondary']}; font-size: 14px;")
-            viewer_layout.addWidget(loading_label)
+        # VTK 3D Viewer or placeholder (decided once the 3D stack is imported)
+        # Create a container for the viewer
+        viewer_container = QWidget()
+        viewer_layout = QVBoxLayout(viewer_container)
+        viewer_layout.setContentsMargins(0, 0, 0, 0)
+        c_lay.addWidget(viewer_container)
+        
+        # Temporary loading label
+        loading_label = QLabel("Initializing 3D Analysis...\nPlease wait...")
+        loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        loading_label.setStyleSheet(f"color: {THEME['text_secondary']}; font-size: 14px;")
+        viewer_layout.addWidget(loading_label)
+        
+        # Store references for model switching
+        self.viewer_container = viewer_container
+        self.viewer_layout = viewer_layout
+        self.loading_label = loading_label
+        
+        # Define initialization function
+        def init_vtk_viewer():
+            # Usually already imported by the background warm-up
+            VTK3DViewer = load_viewer_class()
             
-            # Store references for model switching
-            self.viewer_container = viewer_container
-            self.viewer_layout = viewer_layout
-            self.loading_label = loading_label
+            # Remove loading label
+            self.loading_label.setParent(None)
             
-            # Define initialization function
-            def init_vtk_viewer():
-                try:
-                    # Remove loading label
-                    self.loading_label.setParent(None)
-                    
-                    # Create and add viewer
-                    self.viewer_3d = VTK3DViewer(organ_name=organ_name)
-                    self.viewer_layout.addWidget(self.viewer_3d)
-                    
-                    # Load initial model data
-                    self.load_model_data()
-
-                except Exception as e:
-                    print(f"Error initializing VTK: {e}")
-                    label = QLabel(f"Error initializing 3D Engine:\n{str(e)}")
-                    label.setStyleSheet("color: #F87171;")
-                    label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.viewer_layout.addWidget(label)
-
-            # Schedule initialization after UI shows
-            QTimer.singleShot(100, init_vtk_viewer)
+            if VTK3DViewer is None:
+                self.viewer_layout.addWidget(self.create_vtk_placeholder())
+                return
             
-            # Connect model dropdown to switch models
-            models.currentTextChanged.connect(self.on_model_changed)
-            
-        else:
-            # Fallback placeholder if VTK not available
-            placeholder = QFrame()
-            placeholder.setStyleSheet(f"""
-                border: 2px dashed rgba(108, 159, 255, 0.3);
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 rgba(10, 15, 26, 0.8),
-                    stop:1 rgba(20, 25, 40, 0.8));
-                border-radius: 12px;
-            """)
-            placeholder_layout = QVBoxLayout(placeholder)
-            placeholder_label = QLabel("VTK not installed - 3D viewer unavailable\nInstall with: pip install vtk")
-            placeholder_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            placeholder_label.setStyleSheet(f"color: {THEME['text_secondary']}; font-size: 14px;")
-            placeholder_layout.addWidget(placeholder_label)
-            c_lay.addWidget(placeholder)
+            try:
+                # Create and add viewer
+                self.viewer_3d = VTK3DViewer(organ_name=self.current_organ)
+                self.viewer_layout.addWidget(self.viewer_3d)
+                
+                # Load initial model data
+                self.load_model_data()
+
+            except Exception as e:
+                print(f"Error initializing VTK: {e}")
+                label = QLabel(f"Error initializing 3D Engine:\n{str(e)}")
+                label.setStyleSheet("color: #F87171;")
+                label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.viewer_layout.addWidget(label)
+
+        # Schedule initialization after UI shows
+        QTimer.singleShot(100, init_vtk_viewer)
+        
+        # Connect model dropdown to switch models
+        models.currentTextChanged.connect(self.on_model_changed)
 
         # --- RIGHT PANEL with Scroll Area ---
         right_outer = QWidget()
@@ -721,18 +794,8 @@ class MedicalWorkspace(QMainWindow):
         right.setContentsMargins(10, 5, 10, 5)
         right.setAlignment(Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop)
         
-        part_colors = ["#FFB347", "#FF6B8A", "#4DD4AC", "#A855F7", "#22D3EE"]
+        # Part controls are added by refresh_layer_controls()
         self.part_controls = []
-        
-        # Get parts for current organ and model
-        parts = self.organ_data[organ_name].get(self.current_model, [])
-        for i, (file_name, part_label) in enumerate(parts):
-            color = part_colors[i % len(part_colors)]
-            control = PartControl(part_label, color)
-            add_shadow(control, blur=15, offset=3)
-            right.addWidget(control)
-            self.part_controls.append(control)
-        
         right.addStretch()
         
         # Store right panel for updates
@@ -747,7 +810,24 @@ class MedicalWorkspace(QMainWindow):
         layout.addWidget(right_outer)
 
         self.stack.addWidget(workspace)
-        self.stack.setCurrentIndex(self.stack.count() - 1)
+        self.workspace = workspace
+    
+    def create_vtk_placeholder(self):
+        """Fallback placeholder if VTK not available."""
+        placeholder = QFrame()
+        placeholder.setStyleSheet(f"""
+            border: 2px dashed rgba(108, 159, 255, 0.3);
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                stop:0 rgba(10, 15, 26, 0.8),
+                stop:1 rgba(20, 25, 40, 0.8));
+            border-radius: 12px;
+        """)
+        placeholder_layout = QVBoxLayout(placeholder)
+        placeholder_label = QLabel("VTK not installed - 3D viewer unavailable\nInstall with: pip install vtk")
+        placeholder_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        placeholder_label.setStyleSheet(f"color: {THEME['text_secondary']}; font-size: 14px;")
+        placeholder_layout.addWidget(placeholder_label)
+        return placeholder
     
     def get_asset_path(self):
         """Get the asset path for current model and organ."""
@@ -771,9 +851,14 @@ class MedicalWorkspace(QMainWindow):
         """Load 3D data for the current model and organ, using multiple segmented files."""
         if self.viewer_3d is None:
             return
+        # Part of the 3D stack, already imported with viewer_3d
+        from mask_format import MASK_SUFFIX
         
-        # Reset the viewer before loading new data
-        self.viewer_3d.reset_viewer()
+        # Reuse this organ/model's actors if the viewer still has them cached;
+        # otherwise it starts an empty session for them
+        if self.viewer_3d.switch_session((self.current_organ, self.current_model)):
+            self.connect_part_controls()
+            return
         QApplication.processEvents()
             
         script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -788,10 +873,27 @@ class MedicalWorkspace(QMainWindow):
             (0.13, 0.83, 0.93)  # Cyan #22D3EE
         ]
         
+        label_map_path = os.path.abspath(os.path.join(script_dir, "..", "Assets", model_folder, self.LABEL_MAP_FILE))
+        if os.path.exists(label_map_path):
+            label_parts = [
+                (self.PART_LABEL_IDS[part_label], part_label, part_colors[i % len(part_colors)])
+                for i, (file_name, part_label) in enumerate(parts)
+                if part_label in self.PART_LABEL_IDS
+            ]
+            if self.viewer_3d.add_parts_from_label_map(label_map_path, label_parts, opacity=0.7):
+                self.connect_part_controls()
+                return
+            print(f"Falling back to per-part files for {model_folder}")
+        
         for i, (file_name, part_label) in enumerate(parts):
             asset_path = os.path.join(script_dir, "..", "Assets", model_folder, self.current_organ, file_name)
             asset_path = os.path.abspath(asset_path)
             
+            # Prefer a compact mask (gui/mask_format.py) next to the NIfTI
+            compact_path = asset_path[:-len(".nii.gz")] + MASK_SUFFIX
+            if os.path.exists(compact_path):
+                asset_path = compact_path
+            
             if os.path.exists(asset_path):
                 print(f"Loading part: {part_label} from {asset_path}")
                 color = part_colors[i % len(part_colors)]
@@ -811,6 +913,11 @@ class MedicalWorkspace(QMainWindow):
             # Set viewer reference for color picker
             control.viewer_3d = self.viewer_3d
             
+            # Show the state of actors restored from a cached session
+            state = self.viewer_3d.get_part_state(part_name)
+            if state is not None:
+                control.set_state(*state)
+            
             # Connect visibility checkbox
             control.visible_chk.toggled.connect(
                 lambda checked, pn=part_name: self.viewer_3d.set_part_visibility(pn, checked)
@@ -846,6 +953,7 @@ class MedicalWorkspace(QMainWindow):
         # Clear existing controls
         for control in self.part_controls:
             control.setParent(None)
+            control.deleteLater()
         self.part_controls = []
         
         # Remove old layout items (except header)
@@ -859,7 +967,7 @@ class MedicalWorkspace(QMainWindow):
         parts = self.organ_data[self.current_organ].get(self.current_model, [])
         for i, (file_name, part_label) in enumerate(parts):
             color = part_colors[i % len(part_colors)]
-            control = PartControl(part_label, color)
+            control = PartControl(part_label, color, self.get_part_metrics(file_name))
             add_shadow(control, blur=15, offset=3)
             self.right_panel_layout.insertWidget(self.right_panel_layout.count() - 1, control)
             self.part_controls.append(control)
@@ -885,4 +993,6 @@ if __name__ == "__main__":
     app.setStyle("Fusion")
     window = MedicalWorkspace()
     window.show()
+    # Start importing the 3D stack once the selection screen has been painted
+    QTimer.singleShot(0, warm_heavy_modules)
     sys.exit(app.exec())
\ No newline at end of file
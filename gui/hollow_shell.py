@@ -0,0 +1,99 @@
+"""
+Fast hollow-shell computation for label volumes.
+
+A shell of wall thickness t is every foreground voxel within t face-steps of
+the background, i.e. exactly mask ^ binary_erosion(mask, iterations=t) with a
+6-connected structure. Instead of eroding the whole volume again for every
+thickness, HollowShell crops the mask to its foreground box once and stores a
+capped city-block distance transform, computed slab by slab on a thread pool.
+Any thickness up to MAX_WALL_THICKNESS is then a single comparison.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.ndimage as ndimage
+
+from resampling import foreground_bbox
+
+# Largest wall thickness (voxels) the cached distance field can answer
+MAX_WALL_THICKNESS = 10
+
+# Z slices per worker task (each task also reads MAX_WALL_THICKNESS halo slices)
+SLAB_DEPTH = 32
+
+
+def _slab_distance(mask, z0, z1, cap):
+    """Capped city-block distance to the background for slices z0:z1 of mask.
+
+    Any background voxel within cap steps lies inside the cap-slice halo, so
+    min(distance, cap + 1) is identical to the whole-volume result.
+    """
+    lo = max(z0 - cap, 0)
+    hi = min(z1 + cap, mask.shape[0])
+    dist = ndimage.distance_transform_cdt(mask[lo:hi], metric='taxicab')
+    return np.minimum(dist[z0 - lo:z1 - lo], cap + 1).astype(np.uint8)
+
+
+def capped_distance(mask, cap=MAX_WALL_THICKNESS, workers=None):
+    """
+    City-block distance from each foreground voxel to the background, capped at cap + 1.
+
+    Voxels outside the array count as background (like binary_erosion's
+    default border_value=0). Background voxels are 0.
+
+    Args:
+        mask (np.ndarray): Z,Y,X boolean mask.
+        cap (int): Largest distance that must be exact.
+        workers (int): Thread count (default: CPU count).
+
+    Returns:
+        np.ndarray: uint8 distance field with the shape of mask.
+    """
+    padded = np.pad(mask, 1, mode='constant')
+    bounds = [(z, min(z + SLAB_DEPTH, padded.shape[0])) for z in range(0, padded.shape[0], SLAB_DEPTH)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(bounds) == 1:
+        slabs = [_slab_distance(padded, z0, z1, cap) for z0, z1 in bounds]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(bounds))) as pool:
+            slabs = list(pool.map(lambda b: _slab_distance(padded, b[0], b[1], cap), bounds))
+    return np.concatenate(slabs, axis=0)[1:-1, 1:-1, 1:-1]
+
+
+class HollowShell:
+    """Cached distance field of one mask; shell(t) returns the wall for thickness t."""
+
+    def __init__(self, mask, max_thickness=MAX_WALL_THICKNESS, workers=None):
+        start_time = time.perf_counter()
+        self.shape = mask.shape
+        self.max_thickness = max_thickness
+        self.start = (0, 0, 0)
+        self.distance = None
+
+        bbox = foreground_bbox(mask, pad=0)
+        if bbox is not None:
+            self.start, stop = bbox
+            cropped = mask[self.start[0]:stop[0], self.start[1]:stop[1], self.start[2]:stop[2]]
+            self.distance = capped_distance(cropped, max_thickness, workers)
+        self.elapsed_ms = (time.perf_counter() - start_time) * 1000.0
+
+    def shell(self, wall_thickness):
+        """
+        Return the shell mask (uint8, cropped to the foreground box).
+
+        Args:
+            wall_thickness (int): Wall thickness in voxels (1..max_thickness).
+
+        Returns:
+            np.ndarray: Z,Y,X uint8 shell, or None for an empty mask. Place it
+            with self.start (Z,Y,X index of its first voxel).
+        """
+        if not 1 <= wall_thickness <= self.max_thickness:
+            raise ValueError(f"Wall thickness must be between 1 and {self.max_thickness}, got {wall_thickness}")
+        if self.distance is None:
+            return None
+        return ((self.distance > 0) & (self.distance <= wall_thickness)).view(np.uint8)
@@ -0,0 +1,111 @@
+"""
+Per-organ mask export from a BTCV label volume.
+
+Splitting a label volume into one binary NIfTI per organ used to compare
+the whole volume once per organ and gzip every file serially. Here the
+bounding boxes of all labels are found in one pass (ndimage.find_objects),
+each mask is filled from its box only (in the file's Fortran order), and
+the files are compressed on a thread pool (zlib releases the GIL, so the
+gzip streams really run in parallel).
+
+Output layouts:
+    flat     <output_dir>/<prefix><organ>.nii.gz
+    grouped  <output_dir>/<Organ group>/<prefix><organ>.nii.gz, the
+             Assets/<Model>/<Organ>/ layout the GUI reads
+"""
+
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import nibabel as nib
+import numpy as np
+from scipy import ndimage
+
+# BTCV label id -> file stem (as in Assets/ and the notebook's OrganMapping)
+BTCV_ORGAN_FILES = {
+    1: "spleen",
+    2: "kidney_right",
+    3: "kidney_left",
+    4: "gallbladder",
+    5: "esophagus",
+    6: "liver",
+    7: "stomach",
+    8: "aorta",
+    9: "inferior_vena_cava",
+    10: "portal_vein_and_splenic_vein",
+    11: "pancreas",
+    12: "adrenal_gland_right",
+    13: "adrenal_gland_left",
+}
+
+# GUI organ folders and the labels shown in each (see organ_data in gui.py)
+ORGAN_GROUPS = {
+    "Liver": (6, 4, 1, 10),
+    "Kidneys": (3, 2, 13, 12, 8, 9),
+    "Stomach": (7, 11, 5),
+}
+
+# gzip level for the exported files (1 = fastest, as nibabel uses; 9 = smallest)
+DEFAULT_COMPRESSLEVEL = 1
+
+
+def organ_paths(output_dir, prefix="", grouped=False):
+    """Output path for every BTCV label id, in the flat or grouped layout."""
+    if not grouped:
+        return {label: os.path.join(output_dir, f"{prefix}{name}.nii.gz")
+                for label, name in BTCV_ORGAN_FILES.items()}
+    return {label: os.path.join(output_dir, group, f"{prefix}{BTCV_ORGAN_FILES[label]}.nii.gz")
+            for group, labels in ORGAN_GROUPS.items() for label in labels}
+
+
+def label_bboxes(seg, labels):
+    """Bounding-box slices of each label, found in one pass; absent labels are left out."""
+    if not np.issubdtype(seg.dtype, np.integer):
+        seg = seg.astype(np.int32)
+    boxes = ndimage.find_objects(seg, max_label=max(labels))
+    return {label: boxes[label - 1] for label in labels if boxes[label - 1] is not None}
+
+
+def save_mask(mask, affine, path, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """Write a NIfTI, gzipped at the given level when the path ends in .gz."""
+    image = nib.Nifti1Image(mask, affine)
+    if not path.endswith(".gz"):
+        nib.save(image, path)
+        return
+    with gzip.open(path, "wb", compresslevel=compresslevel) as f:
+        image.to_stream(f)
+
+
+def export_organ_masks(seg, affine, paths, compresslevel=DEFAULT_COMPRESSLEVEL, workers=None):
+    """
+    Write one binary uint8 mask per label present in seg.
+
+    Args:
+        seg (np.ndarray): Label volume (nibabel i,j,k order).
+        affine (np.ndarray): 4x4 affine shared by every mask.
+        paths (dict): Label id -> output path (see organ_paths).
+        compresslevel (int): gzip level, 1-9.
+        workers (int): Files written at once (default: one per CPU, max 8).
+
+    Returns:
+        list: Paths that were written (labels missing from seg are skipped).
+    """
+    start_time = time.perf_counter()
+    boxes = label_bboxes(seg, list(paths))
+
+    def write(label):
+        box = boxes[label]
+        # NIfTI stores voxels in Fortran order; a Fortran-ordered mask is
+        # written as one block instead of being re-ordered slice by slice
+        mask = np.zeros(seg.shape, dtype=np.uint8, order="F")
+        mask[box] = seg[box] == label
+        os.makedirs(os.path.dirname(paths[label]) or ".", exist_ok=True)
+        save_mask(mask, affine, paths[label], compresslevel)
+        return paths[label]
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        written = list(pool.map(write, sorted(boxes)))
+    print(f"Exported {len(written)} organ masks in {(time.perf_counter() - start_time) * 1000.0:.0f} ms")
+    return written
@@ -0,0 +1,102 @@
+"""
+Translation of model label spaces to BTCV ids.
+
+TotalSegmentator and the WholeBody CT bundle predict 100+ classes with
+their own ids. Instead of writing one mask per organ and combining them
+(or comparing the volume once per organ), a lookup table indexed by the
+native id gives the BTCV id of every voxel in one vectorised pass:
+
+    lut = btcv_lut(class_names, ORGAN_LABELS)   # validated once
+    btcv = remap_labels(native_seg, lut)        # lut[native_seg]
+
+Classes that are not BTCV organs map to 0 (background).
+"""
+
+import json
+import os
+
+import numpy as np
+
+from label_export import BTCV_ORGAN_FILES
+
+
+def wholebody_ct_names(bundle_dir):
+    """Native id -> class name of the WholeBody CT bundle (its metadata.json channel_def)."""
+    with open(os.path.join(bundle_dir, "configs", "metadata.json"), "r") as f:
+        metadata = json.load(f)
+    return metadata["network_data_format"]["outputs"]["pred"]["channel_def"]
+
+
+def totalsegmentator_names(task="total"):
+    """Native id -> class name of an installed TotalSegmentator task."""
+    from totalsegmentator.map_to_binary import class_map
+    return class_map[task]
+
+
+def build_lut(native_names, size=None):
+    """
+    Lookup table native id -> BTCV id, matched by organ name.
+
+    Args:
+        native_names (dict): Native id -> class name (ids may be str, as in
+            bundle metadata).
+        size (int): Minimum table length (e.g. the model's class count).
+
+    Returns:
+        np.ndarray: uint8 table; unmatched ids are 0.
+    """
+    btcv_ids = {name: label for label, name in BTCV_ORGAN_FILES.items()}
+    native_names = {int(k): v for k, v in native_names.items()}
+    lut = np.zeros(max(size or 0, max(native_names) + 1), dtype=np.uint8)
+    for native_id, name in native_names.items():
+        lut[native_id] = btcv_ids.get(name, 0)
+    return lut
+
+
+def _same_organ(file_stem, display_name):
+    """'kidney_right' ~ 'Right Kidney', 'portal_vein_and_splenic_vein' ~ 'Portal and Splenic Veins'."""
+    words = display_name.lower().replace("(", " ").replace(")", " ").split()
+    return all(any(word.startswith(part) for word in words) for part in file_stem.split("_"))
+
+
+def validate_lut(lut, organ_labels):
+    """
+    Check a table against the BTCV ORGAN_LABELS of segment_ct.py.
+
+    Every organ id (except 0, background) must be produced by exactly one
+    native class, no unknown id may be produced, and each id's organ must
+    match its ORGAN_LABELS name. Raises ValueError otherwise.
+    """
+    organ_ids = {label for label in organ_labels if label != 0}
+    produced, counts = np.unique(lut[lut > 0], return_counts=True)
+    unknown = set(produced.tolist()) - organ_ids
+    if unknown:
+        raise ValueError(f"Label table produces ids missing from ORGAN_LABELS: {sorted(unknown)}")
+    missing = organ_ids - set(produced.tolist())
+    if missing:
+        raise ValueError(f"No native class for: {', '.join(organ_labels[i] for i in sorted(missing))}")
+    merged = produced[counts > 1].tolist()
+    if merged:
+        raise ValueError(f"Several native classes map to: {', '.join(organ_labels[i] for i in merged)}")
+    for label in sorted(organ_ids):
+        if not _same_organ(BTCV_ORGAN_FILES.get(label, ""), organ_labels[label]):
+            raise ValueError(f"BTCV id {label} is '{BTCV_ORGAN_FILES.get(label)}' here "
+                             f"but '{organ_labels[label]}' in ORGAN_LABELS")
+    return lut
+
+
+def btcv_lut(native_names, organ_labels, size=None):
+    """build_lut() followed by validate_lut()."""
+    return validate_lut(build_lut(native_names, size), organ_labels)
+
+
+def remap_labels(seg, lut):
+    """Translate a native label volume to BTCV ids in one pass (lut[seg])."""
+    if seg.dtype.kind == "f":
+        seg = seg.astype(np.int32)  # label maps read with get_fdata()
+    if seg.dtype.kind == "i" and seg.size and seg.min() < 0:
+        raise ValueError("Label volume has negative ids")
+    try:
+        return lut[seg]
+    except IndexError:
+        raise ValueError(f"Label volume has ids up to {int(seg.max())}, table only covers {len(lut) - 1}")
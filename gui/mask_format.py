@@ -0,0 +1,210 @@
+"""
+Compact storage for binary organ masks.
+
+Every structure under Assets/<Model>/<Organ>/ is a full-grid NIfTI that has
+to be gunzipped in full, even though the organ fills a small part of the
+scan. A compact mask (*.mask.npz, an uncompressed NumPy archive) keeps:
+
+    shape, spacing, origin, direction   geometry of the full SimpleITK grid
+    start, stop                         Z,Y,X bounding box of the foreground
+    label                               voxel value of the foreground
+    first, runs                         run-length encoding of the box (C order,
+                                        runs alternate starting with `first`)
+
+Runs only change at the organ boundary, so file size and decode time scale
+with the organ's size and surface, not with the scan. Decoding is one
+vectorised np.repeat.
+
+Convert in place, writing each <stem>.mask.npz next to its <stem>.nii.gz
+(where gui.py and evaluate_models.py look for it):
+    python gui/mask_format.py Assets
+
+A second argument mirrors the tree elsewhere instead (e.g. to ship only the
+compact masks); the readers only use masks that sit next to a NIfTI or in
+a folder they are pointed at.
+    python gui/mask_format.py Assets Assets-compact
+"""
+
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import SimpleITK as sitk
+
+from resampling import foreground_bbox
+from volume_store import nifti_affine, orient_lps
+
+MASK_SUFFIX = ".mask.npz"
+
+
+def encode_runs(mask):
+    """Run lengths of a flattened boolean array; returns (first value, runs)."""
+    flat = mask.ravel()
+    if flat.size == 0:
+        return 0, np.zeros(0, dtype=np.uint32)
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [flat.size]))
+    return int(flat[0]), np.diff(bounds).astype(np.uint32)
+
+
+def decode_runs(first, runs, shape):
+    """Inverse of encode_runs(): boolean array of the given shape."""
+    values = (np.arange(len(runs)) + first) % 2 == 1
+    return np.repeat(values, runs).reshape(shape)
+
+
+class CompactMask:
+    """A binary mask stored as a bounding box plus run lengths."""
+
+    def __init__(self, shape, start, stop, first, runs, label=1,
+                 spacing=(1.0, 1.0, 1.0), origin=(0.0, 0.0, 0.0), direction=(1, 0, 0, 0, 1, 0, 0, 0, 1)):
+        self.shape = tuple(int(n) for n in shape)
+        self.start = tuple(int(n) for n in start)
+        self.stop = tuple(int(n) for n in stop)
+        self.first = int(first)
+        self.runs = runs
+        self.label = int(label)
+        self.spacing = tuple(float(v) for v in spacing)
+        self.origin = tuple(float(v) for v in origin)
+        self.direction = tuple(float(v) for v in direction)
+
+    @classmethod
+    def from_array(cls, np_data, spacing=(1.0, 1.0, 1.0), origin=(0.0, 0.0, 0.0),
+                   direction=(1, 0, 0, 0, 1, 0, 0, 0, 1)):
+        """Encode a Z,Y,X label array (every non-zero voxel is foreground)."""
+        values = np.unique(np_data[np_data > 0]) if np_data.any() else []
+        label = int(values[0]) if len(values) else 1
+        if len(values) > 1:
+            print(f"Compact masks are binary; {len(values)} labels merged into {label}")
+
+        bbox = foreground_bbox(np_data, pad=0)
+        if bbox is None:
+            start = stop = (0, 0, 0)
+            first, runs = 0, np.zeros(0, dtype=np.uint32)
+        else:
+            start, stop = bbox
+            box = np_data[start[0]:stop[0], start[1]:stop[1], start[2]:stop[2]] > 0
+            first, runs = encode_runs(box)
+        return cls(np_data.shape, start, stop, first, runs, label, spacing, origin, direction)
+
+    @property
+    def box_shape(self):
+        return tuple(b - a for a, b in zip(self.start, self.stop))
+
+    def is_empty(self):
+        return len(self.runs) == 0
+
+    def cropped(self):
+        """Boolean Z,Y,X array of the bounding box only."""
+        return decode_runs(self.first, self.runs, self.box_shape)
+
+    def region(self, start, stop):
+        """Boolean Z,Y,X array of any box of the full grid (zeros outside the mask)."""
+        out = np.zeros([b - a for a, b in zip(start, stop)], dtype=bool)
+        if self.is_empty():
+            return out
+        lo = [max(a, s) for a, s in zip(start, self.start)]
+        hi = [min(b, s) for b, s in zip(stop, self.stop)]
+        if any(h <= l for l, h in zip(lo, hi)):
+            return out
+        box = self.cropped()
+        out[tuple(slice(l - a, h - a) for l, h, a in zip(lo, hi, start))] = \
+            box[tuple(slice(l - s, h - s) for l, h, s in zip(lo, hi, self.start))]
+        return out
+
+    def full(self):
+        """The full-grid Z,Y,X label array (uint8, or larger for big labels)."""
+        dtype = np.uint8 if self.label < 256 else np.int16
+        out = np.zeros(self.shape, dtype=dtype)
+        if not self.is_empty():
+            out[tuple(slice(a, b) for a, b in zip(self.start, self.stop))] = self.cropped() * self.label
+        return out
+
+    def oriented_lps_box(self, pad=1):
+        """
+        The bounding box reoriented like sitk.DICOMOrient(image, 'LPS').
+
+        Args:
+            pad (int): Background voxels added around the box, so surfaces
+                close at the box edge. Clamped at the grid edge, like
+                foreground_bbox's pad.
+
+        Returns:
+            tuple: (Z,Y,X boolean box, spacing, offset). offset (X,Y,Z, mm) is
+            the box's first voxel relative to the first voxel of the full
+            reoriented grid, i.e. where the box sits when the full grid is
+            placed at origin (0, 0, 0) as VTK3DViewer does.
+        """
+        widths = [(min(pad, a), min(pad, n - b)) for a, b, n in zip(self.start, self.stop, self.shape)]
+        direction = np.array(self.direction).reshape(3, 3)
+        box_start = np.array([a - w[0] for a, w in zip(self.start, widths)][::-1])
+        box_origin = np.array(self.origin) + direction @ (box_start * np.array(self.spacing))
+        # Orient a zero-stride stand-in of the full grid just to get its origin
+        _, _, full_origin = orient_lps(np.broadcast_to(False, self.shape), self.spacing, self.origin, self.direction)
+        box = np.pad(self.cropped(), widths)
+        box, spacing, origin = orient_lps(box, self.spacing, box_origin, self.direction)
+        return box, spacing, tuple(o - f for o, f in zip(origin, full_origin))
+
+    def affine(self):
+        """RAS affine of the full grid, as nibabel would report it."""
+        return nifti_affine(self.spacing, self.origin, self.direction)
+
+    def to_sitk(self):
+        image = sitk.GetImageFromArray(self.full())
+        image.SetSpacing(self.spacing)
+        image.SetOrigin(self.origin)
+        image.SetDirection(self.direction)
+        return image
+
+    def save(self, path):
+        np.savez(path, shape=self.shape, start=self.start, stop=self.stop, first=self.first, runs=self.runs,
+                 label=self.label, spacing=self.spacing, origin=self.origin, direction=self.direction)
+
+
+def load_mask(path):
+    """Read a *.mask.npz file."""
+    with np.load(path) as data:
+        return CompactMask(data["shape"], data["start"], data["stop"], data["first"], data["runs"],
+                           data["label"], data["spacing"], data["origin"], data["direction"])
+
+
+def nifti_to_mask(nifti_path, mask_path=None):
+    """Convert a binary NIfTI mask; returns the written *.mask.npz path."""
+    if mask_path is None:
+        mask_path = nifti_path.replace(".nii.gz", "").replace(".nii", "") + MASK_SUFFIX
+    image = sitk.ReadImage(nifti_path)
+    mask = CompactMask.from_array(sitk.GetArrayViewFromImage(image), image.GetSpacing(),
+                                  image.GetOrigin(), image.GetDirection())
+    mask.save(mask_path)
+    return mask_path
+
+
+def mask_to_nifti(mask_path, nifti_path):
+    """Write a *.mask.npz back out as a full-grid NIfTI."""
+    sitk.WriteImage(load_mask(mask_path).to_sitk(), nifti_path, useCompression=nifti_path.endswith(".gz"))
+    return nifti_path
+
+
+def convert_tree(src_root, dst_root=None):
+    """Convert every .nii.gz under src_root to a *.mask.npz beside it (or mirrored under dst_root)."""
+    dst_root = src_root if dst_root is None else dst_root
+    total_src = total_dst = 0
+    for nifti_path in sorted(glob.glob(os.path.join(src_root, "**", "*.nii.gz"), recursive=True)):
+        relative = os.path.relpath(nifti_path, src_root)
+        mask_path = os.path.join(dst_root, relative[:-len(".nii.gz")] + MASK_SUFFIX)
+        os.makedirs(os.path.dirname(mask_path), exist_ok=True)
+        nifti_to_mask(nifti_path, mask_path)
+        total_src += os.path.getsize(nifti_path)
+        total_dst += os.path.getsize(mask_path)
+    print(f"{total_src / 1024**2:.1f} MB of NIfTI -> {total_dst / 1024**2:.1f} MB of compact masks")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    start_time = time.perf_counter()
+    convert_tree(*sys.argv[1:])
+    print(f"Done in {time.perf_counter() - start_time:.1f} s")
@@ -0,0 +1,151 @@
+"""
+Indexed segmentation metrics store.
+
+evaluate_models.py writes one SQLite file (Evaluation-Metrics/metrics.sqlite)
+next to its CSVs, with two keyed tables:
+
+    file_metrics     (model, organ, file) -> dice, iou, hd95   per structure
+    summary_metrics  (model, organ)       -> dice, iou, hd95   per organ mean
+
+The GUI reads it with the standard library only (no pandas) into dicts,
+so every lookup is O(1). When the database is missing the same dicts are
+filled from the *_metrics.csv / *_summary.csv files with the csv module.
+
+Build the database from existing CSVs with:
+    python gui/metrics_store.py Evaluation-Metrics
+"""
+
+import csv
+import glob
+import math
+import os
+import sqlite3
+import sys
+
+METRICS_DB = "metrics.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_metrics (
+    model TEXT NOT NULL, organ TEXT NOT NULL, file TEXT NOT NULL,
+    dice REAL, iou REAL, hd95 REAL,
+    PRIMARY KEY (model, organ, file)
+);
+CREATE TABLE IF NOT EXISTS summary_metrics (
+    model TEXT NOT NULL, organ TEXT NOT NULL,
+    dice REAL, iou REAL, hd95 REAL,
+    PRIMARY KEY (model, organ)
+);
+"""
+
+
+def _number(value):
+    """float, with NaN / empty stored as NULL (None)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _mean(values):
+    # Like pandas' mean(): missing values are skipped
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def write_metrics(db_path, model_name, rows):
+    """
+    Replace one model's metrics in the database.
+
+    Args:
+        db_path (str): SQLite file (created if missing).
+        model_name (str): e.g. "SwinUnter" (same names as the CSV files).
+        rows (list): dicts with Organ, File, Dice, IoU, Hausdorff95.
+    """
+    file_rows = [(model_name, r["Organ"], r["File"], _number(r["Dice"]), _number(r["IoU"]),
+                  _number(r["Hausdorff95"])) for r in rows]
+    organs = sorted({row[1] for row in file_rows})
+    summary_rows = [(model_name, organ) + tuple(_mean([row[i] for row in file_rows if row[1] == organ])
+                                                for i in (3, 4, 5))
+                    for organ in organs]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(_SCHEMA)
+        conn.execute("DELETE FROM file_metrics WHERE model = ?", (model_name,))
+        conn.execute("DELETE FROM summary_metrics WHERE model = ?", (model_name,))
+        conn.executemany("INSERT INTO file_metrics VALUES (?, ?, ?, ?, ?, ?)", file_rows)
+        conn.executemany("INSERT INTO summary_metrics VALUES (?, ?, ?, ?, ?)", summary_rows)
+    conn.close()
+
+
+def import_csvs(metrics_dir, db_path=None):
+    """Build the database from every <model>_metrics.csv in a folder; returns its path."""
+    db_path = db_path or os.path.join(metrics_dir, METRICS_DB)
+    for csv_path in sorted(glob.glob(os.path.join(metrics_dir, "*_metrics.csv"))):
+        model_name = os.path.basename(csv_path)[:-len("_metrics.csv")]
+        with open(csv_path, newline="") as f:
+            write_metrics(db_path, model_name, list(csv.DictReader(f)))
+        print(f"Imported {model_name} metrics")
+    return db_path
+
+
+def _metric_dict(dice, iou, hd95):
+    # NULL (missing, e.g. HD95 of an empty mask) is shown as NaN like before
+    return {"Dice": float("nan") if dice is None else dice,
+            "IoU": float("nan") if iou is None else iou,
+            "Hausdorff95": float("nan") if hd95 is None else hd95}
+
+
+class MetricsStore:
+    """All metrics in memory: summary[model][organ] and files[model][organ][file]."""
+
+    def __init__(self, metrics_dir):
+        self.summary = {}
+        self.files = {}
+        db_path = os.path.join(metrics_dir, METRICS_DB)
+        if os.path.exists(db_path):
+            try:
+                self._load_db(db_path)
+                return
+            except sqlite3.Error as e:
+                print(f"Error reading {db_path}, falling back to CSV files: {e}")
+                self.summary, self.files = {}, {}
+        self._load_csvs(metrics_dir)
+
+    def _load_db(self, db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            for model, organ, dice, iou, hd95 in conn.execute("SELECT model, organ, dice, iou, hd95 FROM summary_metrics"):
+                self.summary.setdefault(model, {})[organ] = _metric_dict(dice, iou, hd95)
+            for model, organ, file, dice, iou, hd95 in conn.execute(
+                    "SELECT model, organ, file, dice, iou, hd95 FROM file_metrics"):
+                self.files.setdefault(model, {}).setdefault(organ, {})[file] = _metric_dict(dice, iou, hd95)
+        finally:
+            conn.close()
+
+    def _load_csvs(self, metrics_dir):
+        for csv_path in glob.glob(os.path.join(metrics_dir, "*_summary.csv")):
+            model = os.path.basename(csv_path)[:-len("_summary.csv")]
+            with open(csv_path, newline="") as f:
+                for row in csv.DictReader(f):
+                    self.summary.setdefault(model, {})[row["Organ"]] = _metric_dict(
+                        _number(row["Dice"]), _number(row["IoU"]), _number(row["Hausdorff95"]))
+        for csv_path in glob.glob(os.path.join(metrics_dir, "*_metrics.csv")):
+            model = os.path.basename(csv_path)[:-len("_metrics.csv")]
+            with open(csv_path, newline="") as f:
+                for row in csv.DictReader(f):
+                    self.files.setdefault(model, {}).setdefault(row["Organ"], {})[row["File"]] = _metric_dict(
+                        _number(row["Dice"]), _number(row["IoU"]), _number(row["Hausdorff95"]))
+
+    def get_summary(self, model, organ):
+        """Organ-level means, or None."""
+        return self.summary.get(model, {}).get(organ)
+
+    def get_file(self, model, organ, file_name):
+        """Per-structure metrics for one ground-truth file name, or None."""
+        return self.files.get(model, {}).get(organ, {}).get(file_name)
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "Evaluation-Metrics"
+    print(f"Wrote {import_csvs(folder)}")
@@ -0,0 +1,161 @@
+"""
+On-disk cache of preprocessed model inputs.
+
+Segmenting a CT repeats the same Orientation -> Spacing -> intensity chain
+every time, even when only the checkpoint or the sliding-window overlap
+changed. PreprocessCache keeps the result as a float16 .npy (plus the
+affine in a JSON sidecar), keyed by a hash of the input file's contents
+and of the recipe, the JSON-able description of the chain:
+
+    recipe = {"orientation": "RAS", "pixdim": [1.5, 1.5, 2.0], ...}
+    array, affine = cache.get(ct_path, recipe)        # None on a miss
+    cache.put(ct_path, recipe, array, affine)
+
+Entries are evicted least-recently-used first once the cache exceeds its
+size budget (the entry directory's mtime is its last use).
+
+List or clear the cache with:
+    python gui/preprocess_cache.py [--clear]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "medical_viewer", "preprocessed")
+
+# Total size of the cache before least-recently-used entries are removed
+DEFAULT_MAX_BYTES = 8 * 1024**3
+
+# Bump when the stored layout changes; older entries are never matched
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PreprocessCache:
+    """float16 preprocessed volumes keyed by (input contents, recipe), LRU-evicted."""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, dtype=np.float16):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def input_digest(self, source_path):
+        """Content hash of an input, re-computed only when its size or mtime changes."""
+        stat = os.stat(source_path)
+        key = (os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(source_path)
+            with self._lock:
+                self._digests[key] = digest
+        return digest
+
+    def entry_dir(self, source_path, recipe):
+        recipe_json = json.dumps(recipe, sort_keys=True)
+        key = f"{CACHE_VERSION}:{self.input_digest(source_path)}:{recipe_json}"
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def get(self, source_path, recipe):
+        """
+        Look up a preprocessed volume.
+
+        Returns:
+            tuple: (float32 array, 4x4 affine), or None on a miss.
+        """
+        entry = self.entry_dir(source_path, recipe)
+        try:
+            with open(os.path.join(entry, "meta.json"), "r") as f:
+                meta = json.load(f)
+            array = np.load(os.path.join(entry, "data.npy"))
+        except (OSError, ValueError):
+            return None
+        os.utime(entry)  # mark as recently used
+        return array.astype(np.float32), np.array(meta["affine"])
+
+    def put(self, source_path, recipe, array, affine):
+        """Store a preprocessed volume (as self.dtype), then evict down to max_bytes."""
+        start_time = time.perf_counter()
+        entry = self.entry_dir(source_path, recipe)
+        os.makedirs(entry, exist_ok=True)
+        meta = {
+            "version": CACHE_VERSION,
+            "source": os.path.abspath(source_path),
+            "recipe": recipe,
+            "shape": list(array.shape),
+            "affine": np.asarray(affine, dtype=float).tolist(),
+        }
+        # Write both files under temporary names so readers never see half an entry
+        with open(os.path.join(entry, "data.npy.tmp"), "wb") as f:
+            np.save(f, np.asarray(array, dtype=self.dtype))
+        with open(os.path.join(entry, "meta.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(entry, "data.npy.tmp"), os.path.join(entry, "data.npy"))
+        os.replace(os.path.join(entry, "meta.json.tmp"), os.path.join(entry, "meta.json"))
+        print(f"Cached preprocessed {os.path.basename(source_path)} {tuple(array.shape)} in "
+              f"{(time.perf_counter() - start_time) * 1000.0:.1f} ms")
+        self.evict(keep=entry)
+        return entry
+
+    def entries(self):
+        """(last use, size in bytes, entry dir) of every entry, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for name in os.listdir(self.root):
+            entry = os.path.join(self.root, name)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                result.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue  # removed by another process meanwhile
+        return sorted(result)
+
+    def evict(self, keep=None):
+        """Remove least-recently-used entries until the cache fits max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        return total
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    cache = PreprocessCache()
+    if "--clear" in sys.argv[1:]:
+        cache.clear()
+        print(f"Cleared {cache.root}")
+        sys.exit(0)
+    for used, size, entry in cache.entries():
+        try:
+            with open(os.path.join(entry, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue  # being written or removed by another process
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(used))}  {size / 1024**2:7.1f} MB  "
+              f"{os.path.basename(meta['source'])}  {json.dumps(meta['recipe'], sort_keys=True)}")
@@ -0,0 +1,90 @@
+"""
+Coalesced rendering for a VTK render window.
+
+Property setters (opacity sliders, colour pickers, visibility toggles) call
+RenderScheduler.request() instead of Render(). Requests are merged so the
+window renders at most once per frame interval: dragging a slider through
+50 values gives a handful of renders, not 50 full translucent re-renders.
+
+Every frame of the window is timed, including camera interaction driven by
+the interactor, so fps() / stats() show the actual effect.
+"""
+
+import time
+from collections import deque
+
+from PyQt6.QtCore import Qt, QTimer
+
+# Minimum time between two scheduled renders (~60 fps)
+MIN_FRAME_INTERVAL_MS = 16
+
+# Frames kept for the FPS / render-time averages
+STATS_WINDOW = 60
+
+
+class RenderScheduler:
+    """Merges render requests into at most one render per frame interval."""
+
+    def __init__(self, render_window, interval_ms=MIN_FRAME_INTERVAL_MS, parent=None):
+        self.render_window = render_window
+        self.interval_ms = interval_ms
+        self.requests = 0
+        self.scheduled_renders = 0
+        self._last_render_end = 0.0
+        self._frame_start = None
+        self._frame_starts = deque(maxlen=STATS_WINDOW)
+        self._render_ms = deque(maxlen=STATS_WINDOW)
+
+        self._timer = QTimer(parent)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self.render_now)
+
+        render_window.AddObserver("StartEvent", self._on_frame_start)
+        render_window.AddObserver("EndEvent", self._on_frame_end)
+
+    def request(self):
+        """Ask for a render; merged with any render already pending."""
+        self.requests += 1
+        if self._timer.isActive():
+            return
+        elapsed_ms = (time.perf_counter() - self._last_render_end) * 1000.0
+        self._timer.start(int(max(0.0, self.interval_ms - elapsed_ms)))
+
+    def is_pending(self):
+        """True while a requested render has not happened yet."""
+        return self._timer.isActive()
+
+    def render_now(self):
+        """Render immediately (and drop the pending request, if any)."""
+        self._timer.stop()
+        self.scheduled_renders += 1
+        self.render_window.Render()
+
+    def _on_frame_start(self, obj, event):
+        self._frame_start = time.perf_counter()
+        self._frame_starts.append(self._frame_start)
+
+    def _on_frame_end(self, obj, event):
+        self._last_render_end = time.perf_counter()
+        if self._frame_start is not None:
+            self._render_ms.append((self._last_render_end - self._frame_start) * 1000.0)
+
+    def fps(self):
+        """Frames per second over the last STATS_WINDOW frames."""
+        if len(self._frame_starts) < 2:
+            return 0.0
+        span = self._frame_starts[-1] - self._frame_starts[0]
+        return (len(self._frame_starts) - 1) / span if span > 0 else 0.0
+
+    def mean_render_ms(self):
+        """Average time of one frame over the last STATS_WINDOW frames."""
+        return sum(self._render_ms) / len(self._render_ms) if self._render_ms else 0.0
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "scheduled_renders": self.scheduled_renders,
+            "fps": self.fps(),
+            "render_ms": self.mean_render_ms(),
+        }
@@ -1,22 +1,92 @@
 import sys
 import os
+from collections import OrderedDict
 import vtk
 import numpy as np
 import SimpleITK as sitk
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel
 from PyQt6.QtCore import Qt
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
-from vtk.util import numpy_support
+from resampling import adaptive_downsample
+from surface_extraction import DEFAULT_ENGINE, extract_surface, split_surface_by_label
+from dicom_loader import load_dicom_folder
+from dicom_index import SeriesIndex
+from volume_store import DEFAULT_STORE_DIR, VolumeStore
+from mask_format import MASK_SUFFIX, load_mask
+from render_scheduler import RenderScheduler
+from vtk_image import numpy_to_vtk_image
+
+
+def build_lod_meshes(polydata, reductions):
+    """Return decimated copies of a surface, one per target reduction (0-1).
+
+    Levels are chained (each one decimates the previous), so the overall
+    reduction is converted to a relative one for every step.
+    """
+    levels = []
+    source = polydata
+    kept = 1.0
+    for reduction in reductions:
+        decimate = vtk.vtkQuadricDecimation()
+        decimate.SetInputData(source)
+        decimate.SetTargetReduction(1.0 - (1.0 - reduction) / kept)
+        decimate.VolumePreservationOn()
+        
+        normals = vtk.vtkPolyDataNormals()
+        normals.SetInputConnection(decimate.GetOutputPort())
+        normals.SplittingOff()
+        normals.Update()
+        
+        level = vtk.vtkPolyData()
+        level.ShallowCopy(normals.GetOutput())
+        levels.append(level)
+        source = level
+        kept = 1.0 - reduction
+    return levels
+
 
 class VTK3DViewer(QWidget):
+    # Level-of-detail settings: decimation levels built per part, the total
+    # triangle count allowed while the camera moves, and the size below
+    # which a part is not worth decimating
+    LOD_REDUCTIONS = (0.5, 0.8, 0.95)
+    LOD_TRIANGLE_BUDGET = 250000
+    LOD_MIN_TRIANGLES = 20000
+    
+    # Persistent DICOM header index shared by all viewers (see dicom_index.py)
+    DICOM_INDEX = SeriesIndex()
+    
+    # Memory-mapped copies of the NIfTI files (see volume_store.py). Opt-in:
+    # used once the store has been created with `python gui/volume_store.py
+    # Assets`; otherwise the .nii.gz files are decoded directly and nothing
+    # is written to the cache directory
+    VOLUME_STORE = VolumeStore() if os.path.isdir(DEFAULT_STORE_DIR) else None
+
+    # Sessions (e.g. one per organ/model) whose actors stay cached after
+    # switching away, for instant switching back; older ones are released
+    MAX_CACHED_SESSIONS = 4
+
+    # Attributes swapped in and out by switch_session()
+    SESSION_STATE = ("actor", "actors", "part_lods", "resample_reports", "active_lod_level",
+                     "np_data", "spacing", "origin")
+
     def __init__(self, parent=None, organ_name="Default"):
         super().__init__(parent)
         self.organ_name = organ_name
         self.np_data = None
         self.spacing = (1.0, 1.0, 1.0)
+        self.origin = (0.0, 0.0, 0.0)
         self.actor = None
         self.actors = {}  # Dictionary for multiple part actors
+        self.part_lods = {}  # part name -> [full mesh, decimated levels...]
+        self.resample_reports = {}  # part name -> adaptive_downsample() report
+        self.lod_enabled = True
+        self.active_lod_level = 0
+        self.surface_engine = DEFAULT_ENGINE  # see surface_extraction.SURFACE_ENGINES
         self.vtk_initialized = False
+        self.render_scheduler = None
+        self.session_key = None
+        self.sessions = OrderedDict()  # session key -> (state dict, camera), least recent first
         
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
@@ -33,6 +103,12 @@ class VTK3DViewer(QWidget):
             # Premium dark background (matches GUI theme)
             self.renderer.SetBackground(0.05, 0.05, 0.1)
             
+            # Swap to coarse meshes while the camera is moving
+            self.renderer.AddObserver("StartEvent", self._on_render_start)
+            
+            # Property changes are merged into at most one render per frame
+            self.render_scheduler = RenderScheduler(self.vtkWidget.GetRenderWindow(), parent=self)
+            
             # Initialize (can be delayed, but this is standard)
             self.iren.Initialize()
             self.iren.Start()
@@ -50,12 +126,94 @@ class VTK3DViewer(QWidget):
         for actor in self.actors.values():
             self.renderer.RemoveActor(actor)
         self.actors = {}
+        self.part_lods = {}
+        self.resample_reports = {}
+        self.active_lod_level = 0
         self.np_data = None
         self.spacing = (1.0, 1.0, 1.0)
         self.origin = (0.0, 0.0, 0.0)
-        if self.vtk_initialized:
-            self.vtkWidget.GetRenderWindow().Render()
+        self.request_render()
     
+    def request_render(self):
+        """Schedule a render; several requests within one frame interval give one render."""
+        if self.render_scheduler is not None:
+            self.render_scheduler.request()
+
+    def render_stats(self):
+        """Scheduler counters plus FPS / mean frame time (see RenderScheduler.stats)."""
+        return self.render_scheduler.stats() if self.render_scheduler is not None else {}
+
+    def switch_session(self, key):
+        """
+        Show session `key` (e.g. an (organ, model) tuple) in this render window.
+
+        The current session's actors, meshes and camera are detached and
+        cached; a cached session is re-attached exactly as it was left.
+        At most MAX_CACHED_SESSIONS detached sessions are kept.
+
+        Returns:
+            bool: True if the session was restored with its actors, False
+            if it starts empty and has to be loaded.
+        """
+        if key == self.session_key:
+            return bool(self.actors) or self.actor is not None
+        
+        if self.session_key is not None and (self.actors or self.actor is not None):
+            self.sessions[self.session_key] = self._detach_session()
+        else:
+            self.reset_viewer()
+        
+        cached = self.sessions.pop(key, None)
+        self.session_key = key
+        if cached is not None:
+            self._attach_session(*cached)
+        
+        while len(self.sessions) > self.MAX_CACHED_SESSIONS:
+            old_key, _ = self.sessions.popitem(last=False)
+            print(f"Released cached 3D session {old_key}")
+        
+        self.request_render()
+        return cached is not None
+
+    def _detach_session(self):
+        """Take the current actors off the renderer; returns (state, camera)."""
+        state = {name: getattr(self, name) for name in self.SESSION_STATE}
+        camera = vtk.vtkCamera()
+        camera.DeepCopy(self.renderer.GetActiveCamera())
+        for actor in self.actors.values():
+            self.renderer.RemoveActor(actor)
+        if self.actor:
+            self.renderer.RemoveActor(self.actor)
+        
+        # Start from a clean state without touching the detached objects
+        self.actor = None
+        self.actors = {}
+        self.part_lods = {}
+        self.resample_reports = {}
+        self.active_lod_level = 0
+        self.np_data = None
+        self.spacing = (1.0, 1.0, 1.0)
+        self.origin = (0.0, 0.0, 0.0)
+        return state, camera
+
+    def _attach_session(self, state, camera):
+        for name, value in state.items():
+            setattr(self, name, value)
+        for actor in self.actors.values():
+            self.renderer.AddActor(actor)
+        if self.actor:
+            self.renderer.AddActor(self.actor)
+        self.renderer.GetActiveCamera().DeepCopy(camera)
+        self.renderer.ResetCameraClippingRange()
+
+    def get_part_state(self, part_name):
+        """(visible, opacity, color) of a part actor, or None."""
+        actor = self.actors.get(part_name)
+        if actor is None:
+            return None
+        prop = actor.GetProperty()
+        return bool(actor.GetVisibility()), prop.GetOpacity(), prop.GetColor()
+
     def set_organ_name(self, name):
         """Update the organ name for color mapping."""
         self.organ_name = name
@@ -63,31 +221,37 @@ class VTK3DViewer(QWidget):
     def load_nifti(self, file_path):
         try:
             print(f"Loading NIfTI: {file_path}")
-            img = sitk.ReadImage(file_path)
-            # Reorient to standard orientation if possible
-            img = sitk.DICOMOrient(img, 'LPS') 
+            # Reoriented to LPS (standard orientation)
+            self.np_data, self.spacing, self.origin = self._read_volume(file_path)
             
-            self.np_data = sitk.GetArrayFromImage(img)
-            self.spacing = img.GetSpacing()
-            self.origin = img.GetOrigin()
-            
-            # Downsample if too large to prevent freezing
-            if max(self.np_data.shape) > 256:
-                print(f"Downsampling large image: {self.np_data.shape}")
-                self.np_data = self.np_data[::2, ::2, ::2]
-                self.spacing = tuple(s * 2 for s in self.spacing)
+            # Downsample to the voxel budget to prevent freezing; the grid
+            # is not cropped so generate_*_3d keep their (0, 0, 0) origin
+            self.np_data, self.spacing, _, _ = adaptive_downsample(self.np_data, self.spacing, crop=False,
+                                                                  multilabel=True)
             
             return True
         except Exception as e:
             print(f"Error loading NIfTI: {e}")
             return False
 
-    def load_dicom(self, folder_path):
+    def _read_volume(self, file_path):
+        """Return (Z,Y,X array, spacing, origin) of a NIfTI reoriented to LPS.
+
+        Goes through VOLUME_STORE when set: the array is a memory-mapped view,
+        so only the voxels that are actually used get read from disk.
+        """
+        if self.VOLUME_STORE is not None:
+            try:
+                return self.VOLUME_STORE.open(file_path).oriented_lps()
+            except Exception as e:
+                print(f"Volume store unavailable for {file_path}, reading directly: {e}")
+        img = sitk.DICOMOrient(sitk.ReadImage(file_path), 'LPS')
+        return sitk.GetArrayFromImage(img), img.GetSpacing(), img.GetOrigin()
+
+    def load_dicom(self, folder_path, progress=None, preview=None):
+        """Load a DICOM series; progress(done, total) / preview(image) as in dicom_loader."""
         try:
-            reader = sitk.ImageSeriesReader()
-            dicom_names = reader.GetGDCMSeriesFileNames(folder_path)
-            reader.SetFileNames(dicom_names)
-            img = reader.Execute()
+            img = load_dicom_folder(folder_path, progress=progress, preview=preview, index=self.DICOM_INDEX)
             
             self.np_data = sitk.GetArrayFromImage(img)
             self.spacing = img.GetSpacing()
@@ -102,26 +266,8 @@ class VTK3DViewer(QWidget):
             return False
         
         try:
-            # Create VTK image data
-            img_data = vtk.vtkImageData()
-            depth, height, width = self.np_data.shape
-            img_data.SetDimensions(width, height, depth)
-            img_data.SetSpacing(self.spacing)
-            img_data.SetOrigin(0, 0, 0)
-            
-            # Convert numpy to vtk array
-            # Handle type mapping
-            vtk_type = numpy_support.get_vtk_array_type(self.np_data.dtype)
-            flat_data = self.np_data.reshape(-1, order='C') # 'C' is usually right for SimpleITK->VTK if dims match
-            
-            # Important: VTK expects data in F-contiguous (Fortran) order for X,Y,Z structure
-            # But SimpleITK returns Z,Y,X. We must permute or flatten correctly.
-            # Easiest way: Permute numpy to X,Y,Z then flatten.
-            data_perm = np.transpose(self.np_data, (2, 1, 0)) # Z,Y,X -> X,Y,Z
-            flat_data = data_perm.flatten(order='F')
-            
-            vtk_array = numpy_support.numpy_to_vtk(num_array=flat_data, deep=True, array_type=vtk_type)
-            img_data.GetPointData().SetScalars(vtk_array)
+            # Create VTK image data (zero-copy view of the Z,Y,X buffer)
+            img_data = numpy_to_vtk_image(self.np_data, self.spacing)
             
             # Dynamically find the target label (ignore 0)
             unique_labels = np.unique(self.np_data)
@@ -134,26 +280,12 @@ class VTK3DViewer(QWidget):
             target_label = valid_labels[0]
             print(f"Generating 3D surface for label: {target_label}")
             
-            # Marching Cubes
-            mc = vtk.vtkDiscreteMarchingCubes()
-            mc.SetInputData(img_data)
-            mc.ComputeNormalsOn()
-            mc.GenerateValues(1, target_label, target_label)
-            
-            # Smooth
-            smoother = vtk.vtkWindowedSincPolyDataFilter()
-            smoother.SetInputConnection(mc.GetOutputPort())
-            smoother.SetNumberOfIterations(15)
-            smoother.BoundarySmoothingOff()
-            smoother.FeatureEdgeSmoothingOff()
-            smoother.SetPassBand(0.001)
-            smoother.NonManifoldSmoothingOn()
-            smoother.NormalizeCoordinatesOn()
-            smoother.Update()
+            # Surface extraction + smoothing
+            surface = extract_surface(img_data, [target_label], self.surface_engine)
 
             # Mapper
             mapper = vtk.vtkPolyDataMapper()
-            mapper.SetInputConnection(smoother.GetOutputPort())
+            mapper.SetInputData(surface)
             mapper.ScalarVisibilityOff()
             
             if self.actor:
@@ -172,7 +304,7 @@ class VTK3DViewer(QWidget):
             
             self.renderer.AddActor(self.actor)
             self.renderer.ResetCamera()
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
             return True
         except Exception as e:
             print(f"Error generating 3D: {e}")
@@ -195,31 +327,22 @@ class VTK3DViewer(QWidget):
         """Load a NIfTI file as a separate part/actor."""
         try:
             print(f"Loading part {part_name} from: {file_path}")
-            img = sitk.ReadImage(file_path)
-            img = sitk.DICOMOrient(img, 'LPS')
-            
-            np_data = sitk.GetArrayFromImage(img)
-            spacing = img.GetSpacing()
+            if file_path.endswith(MASK_SUFFIX):
+                # Compact mask: only the organ's bounding box is decoded
+                np_data, spacing, offset = load_mask(file_path).oriented_lps_box()
+                np_data = np_data.view(np.uint8)
+            else:
+                np_data, spacing, _ = self._read_volume(file_path)
+                offset = (0.0, 0.0, 0.0)
             
-            # Downsample if too large
-            if max(np_data.shape) > 256:
-                np_data = np_data[::2, ::2, ::2]
-                spacing = tuple(s * 2 for s in spacing)
+            # Crop to the structure and reduce it to the voxel/triangle budget;
+            # small structures keep full resolution
+            np_data, spacing, origin, report = adaptive_downsample(np_data, spacing)
+            origin = tuple(o + d for o, d in zip(origin, offset))
+            self.resample_reports[part_name] = report
 
-            depth, height, width = np_data.shape
-            
-            # Create VTK image data
-            img_data = vtk.vtkImageData()
-            img_data.SetDimensions(width, height, depth)
-            img_data.SetSpacing(spacing)
-            img_data.SetOrigin(0, 0, 0)
-            
-            vtk_type = numpy_support.get_vtk_array_type(np_data.dtype)
-            data_perm = np.transpose(np_data, (2, 1, 0))
-            flat_data = data_perm.flatten(order='F')
-            
-            vtk_array = numpy_support.numpy_to_vtk(num_array=flat_data, deep=True, array_type=vtk_type)
-            img_data.GetPointData().SetScalars(vtk_array)
+            # Create VTK image data (zero-copy view of the Z,Y,X buffer)
+            img_data = numpy_to_vtk_image(np_data, spacing, origin)
             
             # Find target label
             unique_labels = np.unique(np_data)
@@ -229,77 +352,174 @@ class VTK3DViewer(QWidget):
                 return False
             target_label = valid_labels[0]
             
-            # Marching Cubes
-            mc = vtk.vtkDiscreteMarchingCubes()
-            mc.SetInputData(img_data)
-            mc.ComputeNormalsOn()
-            mc.GenerateValues(1, target_label, target_label)
-            
-            # Smooth
-            smoother = vtk.vtkWindowedSincPolyDataFilter()
-            smoother.SetInputConnection(mc.GetOutputPort())
-            smoother.SetNumberOfIterations(15)
-            smoother.BoundarySmoothingOff()
-            smoother.FeatureEdgeSmoothingOff()
-            smoother.SetPassBand(0.001)
-            smoother.NonManifoldSmoothingOn()
-            smoother.NormalizeCoordinatesOn()
-            smoother.Update()
-            
-            # Mapper
-            mapper = vtk.vtkPolyDataMapper()
-            mapper.SetInputConnection(smoother.GetOutputPort())
-            mapper.ScalarVisibilityOff()
-            
-            # Actor
-            actor = vtk.vtkActor()
-            actor.SetMapper(mapper)
-            actor.GetProperty().SetOpacity(opacity)
-            actor.GetProperty().SetColor(color)
-            actor.GetProperty().SetSpecular(0.5)
-            actor.GetProperty().SetSpecularPower(20)
+            # Surface extraction + smoothing
+            surface = extract_surface(img_data, [target_label], self.surface_engine)
             
-            self.actors[part_name] = actor
-            self.renderer.AddActor(actor)
+            self._add_part_actor(surface, part_name, color, opacity)
             
             self.renderer.ResetCamera()
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
             return True
             
         except Exception as e:
             print(f"Error adding part {part_name}: {e}")
             return False
 
+    def _add_part_actor(self, polydata, part_name, color, opacity):
+        """Create the mapper/actor for one part and register it by name."""
+        mesh = vtk.vtkPolyData()
+        mesh.ShallowCopy(polydata)
+        
+        levels = [mesh]
+        if self.lod_enabled and mesh.GetNumberOfPolys() >= self.LOD_MIN_TRIANGLES:
+            levels += build_lod_meshes(mesh, self.LOD_REDUCTIONS)
+        self.part_lods[part_name] = levels
+        
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(levels[min(self.active_lod_level, len(levels) - 1)])
+        mapper.ScalarVisibilityOff()
+        
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        actor.GetProperty().SetOpacity(opacity)
+        actor.GetProperty().SetColor(color)
+        actor.GetProperty().SetSpecular(0.5)
+        actor.GetProperty().SetSpecularPower(20)
+        
+        if part_name in self.actors:
+            self.renderer.RemoveActor(self.actors[part_name])
+        self.actors[part_name] = actor
+        self.renderer.AddActor(actor)
+        return actor
+
+    def add_parts_from_label_map(self, file_path, parts, opacity=0.7):
+        """Load a multi-label NIfTI (e.g. segmentation_output.nii.gz) as several parts.
+
+        parts is a list of (label_id, part_name, color) tuples. All labels are
+        surfaced in a single marching-cubes pass instead of one pass per file.
+        """
+        try:
+            print(f"Loading label map: {file_path}")
+            np_data, spacing, _ = self._read_volume(file_path)
+            
+            np_data, spacing, origin, report = adaptive_downsample(np_data, spacing, multilabel=True)
+            self.resample_reports[os.path.basename(file_path)] = report
+            
+            return self._add_label_parts(np_data, spacing, parts, opacity, origin)
+        except Exception as e:
+            print(f"Error loading label map {file_path}: {e}")
+            return False
+
+    def generate_multilabel_3d(self, parts=None, opacity=0.7):
+        """Surface every label of the loaded volume (not just the first one)."""
+        if self.np_data is None:
+            print("No data to generate 3D")
+            return False
+        
+        if parts is None:
+            palette = [(0.9, 0.4, 0.4), (0.8, 0.6, 0.2), (0.3, 0.83, 0.67),
+                       (0.66, 0.33, 0.97), (0.13, 0.83, 0.93), (0.9, 0.6, 0.7)]
+            labels = [int(x) for x in np.unique(self.np_data) if x > 0]
+            parts = [(label, f"Label {label}", palette[i % len(palette)]) for i, label in enumerate(labels)]
+        
+        try:
+            return self._add_label_parts(self.np_data, self.spacing, parts, opacity)
+        except Exception as e:
+            print(f"Error generating 3D: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def _add_label_parts(self, np_data, spacing, parts, opacity, origin=(0.0, 0.0, 0.0)):
+        """Run one discrete marching-cubes pass over all labels and split it per part."""
+        present = set(int(x) for x in np.unique(np_data))
+        for label_id, part_name, _ in parts:
+            if label_id not in present:
+                print(f"Label {label_id} ({part_name}) not found in label map")
+        parts = [p for p in parts if p[0] in present]
+        if not parts:
+            print("Error: None of the requested labels are present.")
+            return False
+        
+        img_data = numpy_to_vtk_image(np_data, spacing, origin)
+        
+        # One extraction pass over every requested label; the surface keeps
+        # each triangle's label so it can be split per part
+        surface = extract_surface(img_data, [label_id for label_id, _, _ in parts], self.surface_engine)
+        
+        for label_id, part_name, color in parts:
+            self._add_part_actor(split_surface_by_label(surface, label_id), part_name, color, opacity)
+        
+        self.renderer.ResetCamera()
+        self.request_render()
+        return True
+
+
+    def _select_interactive_lod(self):
+        """Finest LOD level whose visible triangle total fits the interactive budget."""
+        visible = [name for name, actor in self.actors.items() if actor.GetVisibility()]
+        max_level = len(self.LOD_REDUCTIONS)
+        for level in range(max_level + 1):
+            total = 0
+            for name in visible:
+                levels = self.part_lods.get(name)
+                if levels:
+                    total += levels[min(level, len(levels) - 1)].GetNumberOfPolys()
+            if total <= self.LOD_TRIANGLE_BUDGET:
+                return level
+        return max_level
+
+    def set_lod_level(self, level):
+        """Point every part's mapper at the given LOD level (0 = full mesh)."""
+        if level == self.active_lod_level:
+            return
+        self.active_lod_level = level
+        for name, actor in self.actors.items():
+            levels = self.part_lods.get(name)
+            if levels:
+                actor.GetMapper().SetInputData(levels[min(level, len(levels) - 1)])
+
+    def _on_render_start(self, obj, event):
+        """Use coarse meshes during interaction and the full mesh once it stops.
+
+        Interactor styles raise the render window's desired update rate while
+        the camera is being dragged and restore the still rate on release,
+        which triggers a final full-quality render.
+        """
+        if not self.lod_enabled or not self.part_lods:
+            return
+        interacting = self.vtkWidget.GetRenderWindow().GetDesiredUpdateRate() >= self.iren.GetDesiredUpdateRate()
+        self.set_lod_level(self._select_interactive_lod() if interacting else 0)
 
     def set_part_opacity(self, part_name, val):
         """Set opacity for a specific part (0-100)."""
         if part_name in self.actors:
             self.actors[part_name].GetProperty().SetOpacity(val / 100.0)
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
 
     def set_part_color(self, part_name, color_tuple):
         """Set color for a specific part."""
         if part_name in self.actors:
             self.actors[part_name].GetProperty().SetColor(color_tuple)
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
 
     def set_part_visibility(self, part_name, visible):
         """Set visibility for a specific part."""
         if part_name in self.actors:
             self.actors[part_name].SetVisibility(visible)
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
 
     def set_opacity(self, val):
         if self.actor:
             self.actor.GetProperty().SetOpacity(val / 100.0) # Assume 0-100 input
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
 
     def set_color(self, color_q):
         if self.actor:
             self.actor.GetProperty().SetColor(color_q.redF(), color_q.greenF(), color_q.blueF())
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
 
     def set_visibility(self, visible):
         if self.actor:
             self.actor.SetVisibility(visible)
-            self.vtkWidget.GetRenderWindow().Render()
+            self.request_render()
@@ -0,0 +1,220 @@
+"""
+Memory-mapped volume store.
+
+Every load of a .nii.gz from Assets/ gunzips the whole file on one thread.
+VolumeStore converts a NIfTI once into an uncompressed .npy (the SimpleITK
+Z,Y,X voxel grid, unchanged) plus a JSON sidecar with spacing, origin,
+direction and the equivalent NIfTI affine. Later loads np.load() the array
+with mmap_mode='r', so opening is instant and only the slabs that are
+actually touched are read from disk. Entries are re-converted when the
+source file's size or mtime changes.
+
+Readers:
+    StoredVolume.array         Z,Y,X memmap (SimpleITK / VTK3DViewer order)
+    StoredVolume.ijk_array()   i,j,k view (nibabel / MONAI order), no copy
+    StoredVolume.oriented_lps() view reoriented like sitk.DICOMOrient(img, 'LPS')
+    StoredVolume.slab(z0, z1)  lazy Z slab
+
+Convert a whole tree up front with:
+    python gui/volume_store.py Assets
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import SimpleITK as sitk
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "medical_viewer", "volume_store")
+
+# Bump when the stored layout changes; older entries are re-converted
+STORE_VERSION = 1
+
+# LPS (ITK world) -> RAS (NIfTI world)
+_LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0])
+
+
+def nifti_affine(spacing, origin, direction):
+    """The RAS voxel-to-world affine nibabel reports for a SimpleITK geometry."""
+    affine = np.eye(4)
+    affine[:3, :3] = _LPS_TO_RAS @ np.array(direction, dtype=float).reshape(3, 3) @ np.diag(spacing)
+    affine[:3, 3] = _LPS_TO_RAS @ np.array(origin, dtype=float)
+    return affine
+
+
+def orient_lps(array, spacing, origin, direction):
+    """
+    Reorient a Z,Y,X array like sitk.DICOMOrient(image, 'LPS') using only
+    flips and axis swaps, so the result is a view of the input.
+
+    Args:
+        array (np.ndarray): Z,Y,X voxels.
+        spacing, origin (tuple): X,Y,Z geometry.
+        direction (tuple): Row-major 3x3 direction matrix.
+
+    Returns:
+        tuple: (Z,Y,X array view, spacing, origin), spacing/origin X,Y,Z.
+    """
+    direction = np.array(direction, dtype=float).reshape(3, 3)
+    spacing = np.array(spacing, dtype=float)
+    origin = np.array(origin, dtype=float)
+    size = array.shape[::-1]  # X,Y,Z
+
+    # Flip index axes that point against their dominant world axis
+    for axis in range(3):
+        world = int(np.argmax(np.abs(direction[:, axis])))
+        if direction[world, axis] < 0:
+            array = np.flip(array, axis=2 - axis)
+            origin = origin + direction[:, axis] * spacing[axis] * (size[axis] - 1)
+            direction[:, axis] = -direction[:, axis]
+
+    # Then order index axes as world L, P, S
+    world_of_axis = [int(np.argmax(np.abs(direction[:, axis]))) for axis in range(3)]
+    if sorted(world_of_axis) != [0, 1, 2]:
+        raise ValueError("Cannot reorient an oblique volume with axis swaps")
+    axis_of_world = [world_of_axis.index(world) for world in range(3)]
+    # NumPy axes are reversed (Z,Y,X), hence the 2 - ... mapping
+    array = np.transpose(array, [2 - axis_of_world[2 - n] for n in range(3)])
+    spacing = tuple(float(spacing[axis_of_world[w]]) for w in range(3))
+    return array, spacing, tuple(float(v) for v in origin)
+
+
+class StoredVolume:
+    """A memory-mapped Z,Y,X volume with its SimpleITK geometry."""
+
+    def __init__(self, array, meta):
+        self.array = array
+        self.source = meta["source"]
+        self.spacing = tuple(meta["spacing"])
+        self.origin = tuple(meta["origin"])
+        self.direction = tuple(meta["direction"])
+        self.affine = np.array(meta["affine"])
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def slab(self, z0, z1):
+        """Z slices z0:z1 (still memory-mapped; pages load on first access)."""
+        return self.array[z0:z1]
+
+    def ijk_array(self):
+        """The voxels in nibabel's i,j,k order (a transposed view, no copy)."""
+        return self.array.T
+
+    def oriented_lps(self):
+        """
+        Reorient to LPS like sitk.DICOMOrient(image, 'LPS'); the result is
+        still a view of the memmap (see orient_lps).
+
+        Returns:
+            tuple: (Z,Y,X array view, spacing, origin), spacing/origin X,Y,Z.
+        """
+        return orient_lps(self.array, self.spacing, self.origin, self.direction)
+
+    def to_sitk(self):
+        """A SimpleITK image copy (for filters that need a real sitk.Image)."""
+        image = sitk.GetImageFromArray(np.asarray(self.array))
+        image.SetSpacing(self.spacing)
+        image.SetOrigin(self.origin)
+        image.SetDirection(self.direction)
+        return image
+
+
+class VolumeStore:
+    """Uncompressed, memory-mapped copies of NIfTI files, keyed by source path."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def entry_dir(self, source_path):
+        digest = hashlib.sha1(os.path.abspath(source_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest)
+
+    def _read_meta(self, source_path):
+        try:
+            with open(os.path.join(self.entry_dir(source_path), "meta.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, source_path):
+        """True if the stored copy matches the source file's size and mtime."""
+        meta = self._read_meta(source_path)
+        if meta is None or meta.get("version") != STORE_VERSION:
+            return False
+        stat = os.stat(source_path)
+        return meta["source_size"] == stat.st_size and meta["source_mtime_ns"] == stat.st_mtime_ns
+
+    def convert(self, source_path):
+        """Decode a NIfTI once and write data.npy + meta.json; returns the entry dir."""
+        start_time = time.perf_counter()
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        image = sitk.ReadImage(source_path)
+        array = sitk.GetArrayViewFromImage(image)
+        affine = nifti_affine(image.GetSpacing(), image.GetOrigin(), image.GetDirection())
+
+        meta = {
+            "version": STORE_VERSION,
+            "source": source_path,
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "shape": list(array.shape),
+            "dtype": str(array.dtype),
+            "spacing": list(image.GetSpacing()),
+            "origin": list(image.GetOrigin()),
+            "direction": list(image.GetDirection()),
+            "affine": affine.tolist(),
+        }
+
+        entry = self.entry_dir(source_path)
+        os.makedirs(entry, exist_ok=True)
+        # Write both files under temporary names so readers never see half an entry
+        with open(os.path.join(entry, "data.npy.tmp"), "wb") as f:
+            np.save(f, array)
+        with open(os.path.join(entry, "meta.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(entry, "data.npy.tmp"), os.path.join(entry, "data.npy"))
+        os.replace(os.path.join(entry, "meta.json.tmp"), os.path.join(entry, "meta.json"))
+        print(f"Stored {os.path.basename(source_path)} {array.shape} in "
+              f"{(time.perf_counter() - start_time) * 1000.0:.1f} ms")
+        return entry
+
+    def open(self, source_path, convert=True):
+        """
+        Open the stored copy of a NIfTI, converting it first if needed.
+
+        Args:
+            source_path (str): Original .nii / .nii.gz path.
+            convert (bool): Convert missing or stale entries (otherwise raise).
+
+        Returns:
+            StoredVolume: Read-only memory-mapped volume.
+        """
+        if not self.is_current(source_path):
+            if not convert:
+                raise FileNotFoundError(f"No current stored copy of {source_path}")
+            self.convert(source_path)
+        entry = self.entry_dir(source_path)
+        array = np.load(os.path.join(entry, "data.npy"), mmap_mode="r")
+        return StoredVolume(array, self._read_meta(source_path))
+
+    def convert_all(self, paths, workers=None):
+        """Convert every stale or missing entry, several files at a time."""
+        stale = [p for p in paths if not self.is_current(p)]
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            list(pool.map(self.convert, stale))
+        return len(stale)
+
+
+if __name__ == "__main__":
+    roots = sys.argv[1:] or ["Assets"]
+    files = sorted(f for root in roots for f in glob.glob(os.path.join(root, "**", "*.nii*"), recursive=True))
+    converted = VolumeStore().convert_all(files)
+    print(f"{converted} of {len(files)} volumes converted into {DEFAULT_STORE_DIR}")
@@ -0,0 +1,33 @@
+"""
+NumPy -> vtkImageData hand-off shared by viewer_3d.py and volume_rendering.py.
+"""
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+
+def numpy_to_vtk_image(np_data, spacing, origin=(0.0, 0.0, 0.0)):
+    """Wrap a Z,Y,X NumPy volume as vtkImageData without copying the voxels.
+
+    SimpleITK arrays are C-ordered Z,Y,X, so their raw buffer already has
+    VTK's X-fastest point layout. The array is only copied when it is not
+    C-contiguous (e.g. after strided slicing). The returned image holds a
+    reference to the buffer so it stays valid for the image's lifetime.
+    """
+    if np_data.dtype == np.bool_:
+        np_data = np_data.view(np.uint8)
+    np_data = np.ascontiguousarray(np_data)
+    depth, height, width = np_data.shape
+
+    img_data = vtk.vtkImageData()
+    img_data.SetDimensions(width, height, depth)
+    img_data.SetSpacing(spacing)
+    img_data.SetOrigin(origin)
+
+    vtk_type = numpy_support.get_vtk_array_type(np_data.dtype)
+    vtk_array = numpy_support.numpy_to_vtk(num_array=np_data.ravel(order='C'), deep=False, array_type=vtk_type)
+    img_data.GetPointData().SetScalars(vtk_array)
+    # Keep the NumPy buffer alive as long as VTK may read from it
+    img_data._numpy_reference = np_data
+    return img_data